@@ -26,6 +26,7 @@ def get_fuel_use(source_path: Path) -> list[dict[str, str]]:
 
 import datetime
 from typing import TypedDict
+from timestamp_parser import strptime
 
 class History(TypedDict):
     date: datetime.date
@@ -39,12 +40,12 @@ from collections.abc import Iterable, Iterator
 def make_history(source: Iterable[dict[str, str]]) -> Iterator[History]:
     for row in source:
         yield dict(
-            date=datetime.datetime.strptime(
+            date=strptime(
                 row['date'], "%m/%d/%y").date(),
-            start_time=datetime.datetime.strptime(
+            start_time=strptime(
                 row['engine on'], '%H:%M:%S').time(),
             start_fuel=float(row['fuel height on']),
-            end_time=datetime.datetime.strptime(
+            end_time=strptime(
                 row['engine off'], '%H:%M:%S').time(),
             end_fuel=float(row['fuel height off']),
         )
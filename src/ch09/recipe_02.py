@@ -134,6 +134,199 @@ test_example_8_1 = """
 """
 
 
+# Stage fusion: a run of map and filter stages becomes one loop,
+# so each item resumes one generator, not one per stage.
+
+from collections.abc import Mapping
+from functools import partial
+from typing import Any, Literal, NamedTuple, TypeAlias
+
+class Step(NamedTuple):
+    kind: Literal["map", "filter"]
+    function: Callable[[Any], Any]
+    name: str
+
+Fusible: TypeAlias = Mapping[Callable[..., Any], tuple[Literal["map", "filter"], Callable[[Any], Any]]]
+HigherOrder: TypeAlias = Mapping[Callable[..., Any], Literal["map", "filter"]]
+
+# Generator stages with an equivalent per-item function.
+# Other modules pass their own to Pipeline(); these aren't changed.
+FUSIBLE: Fusible = {
+    parse_date_iter: ("map", parse_date),
+    parse_date_iter_y: ("map", parse_date),
+    parse_date_iter_g: ("map", parse_date),
+    parse_date_iter_m: ("map", parse_date),
+}
+
+# Stages like my_map1(f, source), used as partial(my_map1, f).
+HIGHER_ORDER: HigherOrder = {
+    my_map1: "map",
+    my_map2: "map",
+    map: "map",
+    filter: "filter",
+}
+
+Stage = Callable[[Iterable[Any]], Iterator[Any]]
+
+def name_of(f: Any) -> str:
+    """
+    >>> from operator import itemgetter
+    >>> name_of(parse_date), name_of(itemgetter(0)), name_of(None)
+    ('parse_date', 'operator.itemgetter(0)', 'None')
+    """
+    return getattr(f, "__name__", repr(f))
+
+def as_step(
+    stage: Stage, fusible: Fusible = FUSIBLE, higher_order: HigherOrder = HIGHER_ORDER
+) -> Step | None:
+    if stage in fusible:
+        kind, function = fusible[stage]
+        return Step(kind, function, name_of(stage))
+    if isinstance(stage, partial) and stage.func in higher_order and len(stage.args) == 1:
+        function = stage.args[0]
+        name = f"{name_of(stage.func)}({name_of(function)})"
+        kind = higher_order[stage.func]
+        if function is None:
+            if kind != "filter":
+                return None
+            # filter(None, source) keeps the true items.
+            function = bool
+        return Step(kind, function, name)
+    return None
+
+Runner = Callable[[Iterable[Any], list[int]], Iterator[Any]]
+
+def fuse(steps: list[Step]) -> Runner:
+    """
+    Compile a run of steps into one generator function. ``counts[i]``
+    is incremented by the number of items that passed step ``i``.
+    A map step passes every item it gets, so only the source items and
+    the items that pass each filter are counted in the loop.
+    """
+    body = []
+    totals = []
+    passed = "n"
+    for i, step in enumerate(steps):
+        if step.kind == "map":
+            body.append(f"                item = f{i}(item)")
+        else:
+            body.append(f"                if not f{i}(item): continue")
+            body.append(f"                c{i} += 1")
+            passed = f"c{i}"
+        totals.append(f"counts[{i}] += {passed}")
+    counters = ["n"] + [f"c{i}" for i, step in enumerate(steps) if step.kind == "filter"]
+    names = ", ".join(f"f{i}" for i in range(len(steps)))
+    # The functions are default values, so they're locals in the loop.
+    defaults = ", ".join(f"f{i}=f{i}" for i in range(len(steps)))
+    source = "\n".join([
+        f"def make({names}):",
+        f"    def fused(source, counts, {defaults}):",
+        f"        {' = '.join(counters)} = 0",
+        "        try:",
+        "            for n, item in enumerate(source, 1):",
+        *body,
+        "                yield item",
+        "        finally:",
+        f"            {'; '.join(totals)}",
+        "    return fused",
+    ])
+    namespace: dict[str, Any] = {}
+    exec(compile(source, "<fused>", "exec"), namespace)
+    return cast(Runner, namespace["make"](*(step.function for step in steps)))
+
+def opaque(stage: Stage) -> Runner:
+    def counted(source: Iterable[Any], counts: list[int]) -> Iterator[Any]:
+        for item in stage(source):
+            counts[0] += 1
+            yield item
+    return counted
+
+class Pipeline:
+    """
+    Stacked stages, applied in order. Consecutive map and filter stages
+    are fused; any other generator function runs as it is.
+    ``fusible`` and ``higher_order`` add to ``FUSIBLE`` and ``HIGHER_ORDER``,
+    for this pipeline only.
+    After a run, ``counts`` has each stage's name, and the number of
+    items it produced.
+    """
+    def __init__(
+        self,
+        *stages: Stage,
+        fusible: Fusible | None = None,
+        higher_order: HigherOrder | None = None,
+    ) -> None:
+        fusible = {**FUSIBLE, **(fusible or {})}
+        higher_order = {**HIGHER_ORDER, **(higher_order or {})}
+        self.names: list[str] = []
+        runs: list[list[Step] | Stage] = []
+        for stage in stages:
+            step = as_step(stage, fusible, higher_order)
+            if step is None:
+                self.names.append(name_of(stage))
+                runs.append(stage)
+            else:
+                self.names.append(step.name)
+                if runs and isinstance(runs[-1], list):
+                    runs[-1].append(step)
+                else:
+                    runs.append([step])
+        # Each part is the number of stages, and the runner for them.
+        self.parts: list[tuple[int, Runner]] = [
+            (len(run), fuse(run)) if isinstance(run, list) else (1, opaque(run))
+            for run in runs
+        ]
+        self.tallies: list[list[int]] = []
+
+    def __call__(self, source: Iterable[Any]) -> Iterator[Any]:
+        self.tallies = []
+        items: Iterable[Any] = source
+        for size, runner in self.parts:
+            self.tallies.append([0] * size)
+            items = runner(items, self.tallies[-1])
+        return iter(items)
+
+    @property
+    def counts(self) -> list[tuple[str, int]]:
+        """The counts, complete once the last run is exhausted or closed."""
+        counts = (n for tally in self.tallies for n in tally)
+        return list(zip(self.names, counts))
+
+test_pipeline = """
+>>> data = [
+... RawLog("2016-04-24 11:05:01,462", "INFO", "module1", "Sample Message One"),
+... RawLog("2016-04-24 11:06:02,624", "DEBUG", "module2", "Debugging"),
+... RawLog("2016-04-24 11:07:03,246", "WARNING", "module1", "Something might have gone wrong"),
+... ] * 3
+
+>>> def not_debug(log: DatedLog) -> bool:
+...     return log.level != "DEBUG"
+>>> def hour(log: DatedLog) -> int:
+...     return log.date.hour
+
+>>> nested = my_map2(hour, filter(not_debug, my_map1(lambda x: x, parse_date_iter(data))))
+>>> pipeline = Pipeline(
+...     parse_date_iter, partial(my_map1, lambda x: x), partial(filter, not_debug), partial(my_map2, hour)
+... )
+>>> len(pipeline.parts)
+1
+>>> list(pipeline(data)) == list(nested)
+True
+>>> pipeline.counts
+[('parse_date_iter', 9), ('my_map1(<lambda>)', 9), ('filter(not_debug)', 6), ('my_map2(hour)', 6)]
+
+Functions without a ``__name__``, and ``filter(None, ...)``.
+
+>>> from operator import itemgetter
+>>> pairs = [(0, "a"), (1, ""), (2, "c")]
+>>> pipeline = Pipeline(partial(map, itemgetter(1)), partial(filter, None))
+>>> list(pipeline(pairs)) == list(filter(None, map(itemgetter(1), pairs)))
+True
+>>> pipeline.counts
+[('map(operator.itemgetter(1))', 3), ('filter(None)', 2)]
+"""
+
+
 # End of Applying transformations to a collection
 
 __test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
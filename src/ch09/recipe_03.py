@@ -140,6 +140,7 @@ test_example_3_4 = """
 
 import datetime
 from typing import NamedTuple
+from timestamp_parser import strptime
 
 class DatetimeRow(NamedTuple):
     date: datetime.date
@@ -150,13 +151,13 @@ class DatetimeRow(NamedTuple):
     other_notes: str
 
 def convert_datetime(row: CombinedRow) -> DatetimeRow:
-    travel_date = datetime.datetime.strptime(
+    travel_date = strptime(
         row.date, "%m/%d/%y").date()
-    start_time = datetime.datetime.strptime(
+    start_time = strptime(
         row.engine_on_time, "%I:%M:%S %p").time()
     start_datetime = datetime.datetime.combine(
         travel_date, start_time)
-    end_time = datetime.datetime.strptime(
+    end_time = strptime(
         row.engine_off_time, "%I:%M:%S %p").time()
     end_datetime = datetime.datetime.combine(
         travel_date, end_time)
@@ -197,6 +197,55 @@ test_example_6_3 = """
  CombinedRow(date='10/26/13', engine_on_time='09:12:00 AM', engine_on_fuel_height='27', filler_1='', engine_off_time='06:25:00 PM', engine_off_fuel_height='22', filler_2='', other_notes="choppy -- anchor in jackson's creek", filler_3='')]
 """
 
+# subsection: There's more...
+# Topic: Fusing the filter stages
+
+from functools import partial
+from recipe_02 import Fusible, HigherOrder, Pipeline
+
+FILTER_STAGES: Fusible = {
+    data_filter_iter: ("filter", should_be_passed),
+    skip_header_date_iter: ("filter", pass_non_date),
+    skip_header_gen: ("filter", pass_non_date),
+    pass_date_iter: ("filter", row_has_date),
+}
+FILTER_FUNCTIONS: HigherOrder = {
+    my_filter_stmt: "filter",
+    my_filter_gen: "filter",
+}
+
+test_pipeline = """
+>>> from recipe_03 import row_merge
+>>> from pathlib import Path
+>>> import csv
+
+>>> with Path('data/fuel.csv').open() as source_file:
+...     reader = csv.reader(source_file)
+...     log_rows = list(reader)
+
+>>> def morning(row: CombinedRow) -> bool:
+...     return row.engine_on_time.endswith("AM")
+>>> nested = my_filter_gen(
+...     morning, pass_date_iter(skip_header_date_iter(data_filter_iter(row_merge(log_rows))))
+... )
+>>> pipeline = Pipeline(
+...     row_merge, data_filter_iter, skip_header_date_iter, pass_date_iter,
+...     partial(my_filter_gen, morning),
+...     fusible=FILTER_STAGES, higher_order=FILTER_FUNCTIONS,
+... )
+>>> [size for size, _ in pipeline.parts]
+[1, 4]
+>>> list(pipeline(log_rows)) == list(nested)
+True
+>>> pipeline.counts
+[('row_merge', 3), ('data_filter_iter', 3), ('skip_header_date_iter', 2), ('pass_date_iter', 2), ('my_filter_gen(morning)', 2)]
+
+Without them, these stages run as they are.
+
+>>> [size for size, _ in Pipeline(data_filter_iter, pass_date_iter).parts]
+[1, 1]
+"""
+
 # End of Picking a subset -- three ways to filter
 
 __test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
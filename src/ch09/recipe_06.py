@@ -43,6 +43,7 @@ test_example_2_1 = """
 from recipe_03 import row_merge, CombinedRow
 import datetime
 from dataclasses import dataclass, field
+from timestamp_parser import strptime
 
 @dataclass
 class Leg:
@@ -89,9 +90,9 @@ def reject_date_header(row: Leg) -> bool:
 def timestamp(
     date_text: str, time_text: str
 ) -> datetime.datetime:
-    date = datetime.datetime.strptime(
+    date = strptime(
         date_text, "%m/%d/%y").date()
-    time = datetime.datetime.strptime(
+    time = strptime(
         time_text, "%I:%M:%S %p").time()
     timestamp = datetime.datetime.combine(
         date, time)
@@ -169,6 +170,177 @@ def summary_t(raw_data: Iterable[list[str]]) -> None:
     print(f"Fuel use {m:.2f} ±{s:.2f}")
 
 
+# Batch mode: the same stages, applied to a list of rows at a time.
+# Each stage takes a chunk and returns it, with the per-row work in one
+# loop per stage. Each distinct date and time text is parsed once per chunk.
+
+from itertools import islice
+
+def legs_batch(rows: list[CombinedRow]) -> list[Leg]:
+    return [leg for leg in map(make_Leg, rows) if reject_date_header(leg)]
+
+def timestamps_batch(legs: list[Leg]) -> list[Leg]:
+    dates = {
+        text: strptime(text, "%m/%d/%y").date()
+        for text in {leg.date for leg in legs}
+    }
+    times = {
+        text: strptime(text, "%I:%M:%S %p").time()
+        for text in {leg.start_time for leg in legs} | {leg.end_time for leg in legs}
+    }
+    combine = datetime.datetime.combine
+    for leg in legs:
+        leg.start_timestamp = combine(dates[leg.date], times[leg.start_time])
+        leg.end_timestamp = combine(dates[leg.date], times[leg.end_time])
+    return legs
+
+def duration_batch(legs: list[Leg]) -> list[Leg]:
+    for leg in legs:
+        travel_time = leg.end_timestamp - leg.start_timestamp
+        leg.travel_hours = round(travel_time.total_seconds() / 60 / 60, 1)
+    return legs
+
+def fuel_use_batch(legs: list[Leg]) -> list[Leg]:
+    for leg in legs:
+        leg.fuel_change = float(leg.start_fuel_height) - float(leg.end_fuel_height)
+    return legs
+
+def fuel_per_hour_batch(legs: list[Leg]) -> list[Leg]:
+    for leg in legs:
+        leg.fuel_per_hour = leg.fuel_change / leg.travel_hours
+    return legs
+
+def clean_data_batches(
+    source: Iterable[CombinedRow], size: int = 4_096
+) -> Iterator[list[Leg]]:
+    row_iter = iter(source)
+    while rows := list(islice(row_iter, size)):
+        yield fuel_per_hour_batch(
+            fuel_use_batch(duration_batch(timestamps_batch(legs_batch(rows))))
+        )
+
+def clean_data_chunked(
+    source: Iterable[CombinedRow], size: int = 4_096
+) -> Iterator[Leg]:
+    for batch in clean_data_batches(source, size):
+        yield from batch
+
+test_batches = """
+>>> from pathlib import Path
+>>> import csv
+
+>>> with Path('data/fuel.csv').open() as source_file:
+...     reader = csv.reader(source_file)
+...     log_rows = list(reader)
+>>> rows = list(row_merge(log_rows))
+
+>>> list(clean_data_chunked(rows)) == list(clean_data_iter(rows))
+True
+
+>>> many = rows + [
+...     row._replace(date=f"{1 + n % 12}/{1 + n % 28}/{n % 100:02d}")
+...     for n in range(1_000) for row in rows[1:]
+... ]
+>>> [len(batch) for batch in clean_data_batches(many[:20], 7)]
+[6, 7, 6]
+>>> list(clean_data_chunked(many, 7)) == list(clean_data_iter(many))
+True
+"""
+
+
+# Parallel map: the per-row stages are pure functions of one row,
+# so chunks of rows can be mapped in worker processes.
+
+from collections import deque
+from collections.abc import Callable
+from concurrent import futures
+import os
+from typing import TypeVar
+
+P = TypeVar("P")
+Q = TypeVar("Q")
+
+def map_chunk(fn: Callable[[P], Q], chunk: list[P]) -> list[Q]:
+    return list(map(fn, chunk))
+
+def parallel_map(
+    fn: Callable[[P], Q],
+    source: Iterable[P],
+    workers: int | None = None,
+    chunksize: int = 1_024,
+) -> Iterator[Q]:
+    """
+    ``map(fn, source)``, with chunks mapped in a process pool.
+    The results are in order. At most ``2 * workers`` chunks are in flight,
+    so the source is consumed lazily. A source with fewer than
+    ``chunksize`` items is mapped inline. ``fn`` must be picklable.
+    """
+    workers = workers or os.cpu_count() or 1
+    item_iter = iter(source)
+    first = list(islice(item_iter, chunksize))
+    if len(first) < chunksize or workers == 1:
+        yield from map(fn, first)
+        yield from map(fn, item_iter)
+        return
+    executor = futures.ProcessPoolExecutor(workers)
+    try:
+        pending = deque([executor.submit(map_chunk, fn, first)])
+        while chunk := list(islice(item_iter, chunksize)):
+            pending.append(executor.submit(map_chunk, fn, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def clean_leg(row: Leg) -> Leg:
+    return fuel_per_hour(fuel_use(duration(end_datetime(start_datetime(row)))))
+
+def clean_data_parallel(
+    source: Iterable[CombinedRow], workers: int | None = None, chunksize: int = 1_024
+) -> Iterator[Leg]:
+    legs = filter(reject_date_header, map(make_Leg, source))
+    return parallel_map(clean_leg, legs, workers, chunksize)
+
+test_parallel_map = """
+>>> from pathlib import Path
+>>> import csv
+>>> from recipe_03 import convert_datetime, skip_header_date
+
+>>> with Path('data/fuel.csv').open() as source_file:
+...     reader = csv.reader(source_file)
+...     log_rows = list(reader)
+>>> rows = list(row_merge(log_rows))
+>>> many = rows + [
+...     row._replace(date=f"{1 + n % 12}/{1 + n % 28}/{n % 100:02d}")
+...     for n in range(500) for row in rows[1:]
+... ]
+
+>>> list(clean_data_parallel(rows)) == list(clean_data_iter(rows))
+True
+>>> list(clean_data_parallel(many, workers=2, chunksize=64)) == list(clean_data_iter(many))
+True
+
+>>> dated = list(skip_header_date(many))
+>>> list(parallel_map(convert_datetime, dated, 2, 100)) == list(map(convert_datetime, dated))
+True
+
+Only a few chunks are taken from the source before the first result.
+
+>>> taken = []
+>>> def source():
+...     for row in dated:
+...         taken.append(row)
+...         yield row
+>>> results = parallel_map(convert_datetime, source(), 2, 10)
+>>> first = next(results)
+>>> len(taken) <= 5 * 10
+True
+>>> results.close()
+"""
+
+
 # End of Combining the map and reduce transformations
 
 __test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
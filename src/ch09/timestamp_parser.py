@@ -0,0 +1,123 @@
+# Python Cookbook, 3rd Ed.
+#
+# Memoized strptime() for the date and time formats in the logs.
+#
+# The fuel and waypoint logs repeat the same few date and time strings
+# across many rows. Each format used there has a parser that slices the
+# text with one regular expression and builds the datetime directly.
+# Anything that parser doesn't accept -- another format, unusual padding,
+# a value out of range -- goes to datetime.strptime(), so the results and
+# the ValueError messages are the same. The parsed values are kept in
+# a bounded LRU cache; datetime objects are immutable, so sharing is safe.
+#
+# The %p parser assumes the English AM/PM of the C locale.
+
+from collections.abc import Callable
+import datetime
+from functools import lru_cache
+import re
+
+CACHE_SIZE = 4_096
+
+MDY = re.compile(r"(\d\d?)/(\d\d?)/(\d\d)", re.ASCII)
+YMD = re.compile(r"(\d{4})-(\d\d?)-(\d\d?)", re.ASCII)
+HMS = re.compile(r"(\d\d?):(\d\d?):(\d\d?)", re.ASCII)
+IMSP = re.compile(r"(\d\d?):(\d\d?):(\d\d?) ([AP])M", re.ASCII | re.IGNORECASE)
+
+
+def parse_mdy(text: str) -> datetime.datetime | None:
+    if (match := MDY.fullmatch(text)) is None:
+        return None
+    month, day, yy = map(int, match.groups())
+    # The POSIX convention, as used by strptime(): 69-99 are 1969-1999.
+    return datetime.datetime(yy + (1900 if yy >= 69 else 2000), month, day)
+
+
+def parse_ymd(text: str) -> datetime.datetime | None:
+    if (match := YMD.fullmatch(text)) is None:
+        return None
+    year, month, day = map(int, match.groups())
+    return datetime.datetime(year, month, day)
+
+
+def parse_hms(text: str) -> datetime.datetime | None:
+    if (match := HMS.fullmatch(text)) is None:
+        return None
+    hour, minute, second = map(int, match.groups())
+    return datetime.datetime(1900, 1, 1, hour, minute, second)
+
+
+def parse_imsp(text: str) -> datetime.datetime | None:
+    if (match := IMSP.fullmatch(text)) is None:
+        return None
+    hour, minute, second = map(int, match.groups()[:3])
+    if not 1 <= hour <= 12:
+        return None
+    hour %= 12
+    if match.group(4) in "Pp":
+        hour += 12
+    return datetime.datetime(1900, 1, 1, hour, minute, second)
+
+
+FAST: dict[str, Callable[[str], datetime.datetime | None]] = {
+    "%m/%d/%y": parse_mdy,
+    "%Y-%m-%d": parse_ymd,
+    "%H:%M:%S": parse_hms,
+    "%I:%M:%S %p": parse_imsp,
+}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def strptime(text: str, format: str) -> datetime.datetime:
+    """
+    The same result as ``datetime.datetime.strptime(text, format)``.
+
+    >>> strptime("10/25/13", "%m/%d/%y")
+    datetime.datetime(2013, 10, 25, 0, 0)
+    >>> strptime("01:15:00 PM", "%I:%M:%S %p")
+    datetime.datetime(1900, 1, 1, 13, 15)
+    >>> strptime("2/30/13", "%m/%d/%y")
+    Traceback (most recent call last):
+    ...
+    ValueError: day is out of range for month
+    """
+    if (parse := FAST.get(format)) is not None:
+        try:
+            if (result := parse(text)) is not None:
+                return result
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(text, format)
+
+
+test_strptime = """
+>>> samples = {
+...     "%m/%d/%y": ["10/25/13", "1/5/69", "12/31/68", " 5/ 6/13", "13/1/13", "0/1/13", "1/1/2013", "2/29/12", "2/29/13"],
+...     "%Y-%m-%d": ["2012-11-27", "2012-1-2", "0001-01-01", "2012-02-30", "12-11-27", "2012-11-27 "],
+...     "%H:%M:%S": ["09:15:00", "0:0:0", "23:59:59", "24:00:00", "12:60:00", "12:00:61", "9:15"],
+...     "%I:%M:%S %p": ["08:24:00 AM", "12:00:00 AM", "12:30:00 PM", "1:2:3 pm", "00:10:00 AM", "13:00:00 PM", "08:24:00  AM"],
+...     "%d %b %Y": ["25 Oct 2013"],
+... }
+>>> def outcome(parser, text, format):
+...     try:
+...         return parser(text, format)
+...     except ValueError as ex:
+...         return str(ex)
+>>> [
+...     (text, format)
+...     for format, texts in samples.items()
+...     for text in texts
+...     if outcome(strptime, text, format) != outcome(datetime.datetime.strptime, text, format)
+... ]
+[]
+
+Repeated strings are parsed once.
+
+>>> strptime.cache_clear()
+>>> dates = [strptime(text, "%m/%d/%y") for text in ["10/25/13", "10/26/13"] * 500]
+>>> info = strptime.cache_info()
+>>> info.hits, info.misses, info.maxsize
+(998, 2, 4096)
+"""
+
+__test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
@@ -18,6 +18,7 @@ lat,lon,date,time
 from dataclasses import dataclass, field
 import datetime
 from collections.abc import Iterator
+from timestamp_parser import strptime
 
 @dataclass
 class RawRow:
@@ -35,10 +36,10 @@ class Waypoint:
     timestamp: datetime.datetime = field(init=False)
 
     def __post_init__(self) -> None:
-        self.ts_date = datetime.datetime.strptime(
+        self.ts_date = strptime(
             self.raw.date, "%Y-%m-%d"
         ).date()
-        self.ts_time = datetime.datetime.strptime(
+        self.ts_time = strptime(
             self.raw.time, "%H:%M:%S"
         ).time()
         self.lat_lon = (
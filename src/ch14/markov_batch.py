@@ -0,0 +1,95 @@
+"""
+Python Cookbook, 3rd Ed.
+
+Chapter 14, Application Integration: Combination
+Markov Generator, NumPy batch engine
+
+All of the chains in a batch are advanced together, one roll per step.
+Each step rolls the dice for every chain still in play and looks up the
+next states in the ``markov_gen.TRANSITIONS`` table.
+Chains that reach a terminal state drop out of the active set.
+
+This uses NumPy's random stream, so a seed gives different
+(but equally reproducible) chains from the ``markov_gen.Dice`` engine.
+"""
+from collections.abc import Iterator
+from typing import NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+import markov_gen
+
+TRANSITIONS = np.array(markov_gen.TRANSITIONS, dtype=np.int8)
+
+
+class Batch(NamedTuple):
+    """
+    A batch of chains.
+    ``outcomes[i]`` is True for Success.
+    Chain ``i`` is ``rolls[offsets[i]:offsets[i + 1]]``,
+    and has ``lengths[i]`` rolls.
+    """
+
+    outcomes: npt.NDArray[np.bool_]
+    lengths: npt.NDArray[np.int64]
+    rolls: npt.NDArray[np.uint8]
+    offsets: npt.NDArray[np.int64]
+
+    def __len__(self) -> int:
+        return len(self.outcomes)
+
+    def chains(self) -> Iterator[tuple[str, markov_gen.Chain]]:
+        """Yields (outcome, chain) pairs, like ``markov_gen.make_chain``."""
+        rolls = self.rolls.tolist()
+        for outcome, start, end in zip(
+            self.outcomes.tolist(), self.offsets[:-1].tolist(), self.offsets[1:].tolist()
+        ):
+            yield ("Success" if outcome else "Fail"), rolls[start:end]
+
+
+def make_chains(n: int, seed: int | None = None) -> Batch:
+    """
+    Generate ``n`` chains.
+
+    >>> batch = make_chains(1_000, 42)
+    >>> len(batch), int(batch.lengths.sum()) == len(batch.rolls)
+    (1000, True)
+    >>> def replay(chain: markov_gen.Chain) -> str | None:
+    ...     state = markov_gen.START
+    ...     for roll in chain:
+    ...         if state < 0:
+    ...             return None  # Rolls after a terminal state
+    ...         state = markov_gen.TRANSITIONS[state][roll]
+    ...     return markov_gen.OUTCOMES.get(state)
+    >>> all(replay(chain) == outcome for outcome, chain in batch.chains())
+    True
+    >>> make_chains(10, 42).rolls.tolist() == make_chains(10, 42).rolls.tolist()
+    True
+    """
+    rng = np.random.default_rng(seed)
+    state = np.full(n, markov_gen.START, dtype=np.int8)
+    lengths = np.zeros(n, dtype=np.int64)
+    active = np.arange(n)
+    # Each step: the indices of the chains in play, and their rolls.
+    steps: list[tuple[npt.NDArray[np.int64], npt.NDArray[np.uint8]]] = []
+    while len(active):
+        dice = rng.integers(1, 7, size=(2, len(active)), dtype=np.uint8)
+        roll = dice[0] + dice[1]
+        steps.append((active, roll))
+        lengths[active] += 1
+        next_state = TRANSITIONS[state[active], roll]
+        state[active] = next_state
+        active = active[next_state >= 0]
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    rolls = np.empty(int(offsets[-1]), dtype=np.uint8)
+    for position, (indices, roll) in enumerate(steps):
+        rolls[offsets[indices] + position] = roll
+    return Batch(
+        outcomes=state == markov_gen.SUCCEED,
+        lengths=lengths,
+        rolls=rolls,
+        offsets=offsets,
+    )
@@ -0,0 +1,204 @@
+"""
+Python Cookbook, 3rd Ed.
+
+Chapter 14, Application Integration: Combination
+Markov Generator, result cache
+
+A seeded run of ``markov_gen`` always writes the same bytes. This caches
+each output file under a key made from everything that determines those
+bytes: the generator version, the seed, the samples, the engine, the offset,
+and the output name, which is in the header and sets the file format.
+
+A hit puts the cached file at the output path: a reflink (copy-on-write
+clone) where the filesystem supports it, a copy otherwise. It's never a
+hard link: any program may rewrite the output, and that mustn't change
+the cache. The output is an ordinary, writable file; the cached files are
+read-only. The least-recently-used entries are evicted when the cache
+grows past its size limit.
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+
+# From <linux/fs.h>: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+DEFAULT_LIMIT = 1 << 30
+
+
+def reflink(source: Path, target: Path) -> bool:
+    """A copy-on-write clone of ``source`` at ``target``, if possible."""
+    try:
+        # Unix only; elsewhere, there's no reflink.
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with source.open("rb") as src, target.open("wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        target.unlink(missing_ok=True)
+        return False
+
+
+def clone(source: Path, target: Path) -> None:
+    """
+    A reflink or a copy of ``source`` at ``target``; never the same inode.
+    ``target`` is a new file, with the default (writable) mode.
+    """
+    if not reflink(source, target):
+        shutil.copyfile(source, target)
+
+
+class ResultCache:
+    def __init__(self, directory: Path, limit: int = DEFAULT_LIMIT) -> None:
+        self.directory = directory
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(opts: argparse.Namespace, version: str) -> str | None:
+        """
+        The key for a run, or None if the run isn't reproducible.
+
+        >>> opts = argparse.Namespace(samples=10, randomize=1, output=Path("x.csv"))
+        >>> len(ResultCache.key(opts, "1"))
+        64
+        >>> ResultCache.key(opts, "1") == ResultCache.key(opts, "2")
+        False
+        >>> ResultCache.key(argparse.Namespace(samples=10, randomize=0, output=Path("x.csv")), "1")
+        """
+        offset = getattr(opts, "offset", None)
+        if not opts.randomize and offset is None:
+            return None
+        identity = {
+            "version": version,
+            "seed": opts.randomize,
+            "samples": opts.samples,
+            "engine": getattr(opts, "engine", "table"),
+            "offset": offset,
+            "output": str(opts.output),
+        }
+        text = json.dumps(identity, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def fetch(self, key: str, output: Path) -> bool:
+        """Put the cached file at ``output``, if there is one."""
+        entry = self.path(key)
+        if not entry.exists():
+            self.misses += 1
+            return False
+        output.unlink(missing_ok=True)
+        clone(entry, output)
+        # The modification time is the LRU order.
+        os.utime(entry)
+        self.hits += 1
+        return True
+
+    def store(self, key: str, output: Path) -> None:
+        entry = self.path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        temporary = entry.with_name(f"{key}.{os.getpid()}.tmp")
+        clone(output, temporary)
+        temporary.chmod(0o444)
+        os.replace(temporary, entry)
+        self.evict()
+
+    def evict(self) -> list[Path]:
+        """Remove the least-recently-used entries, until under the limit."""
+        entries = [
+            (stat.st_mtime_ns, stat.st_size, path)
+            for path in self.directory.glob("??/*")
+            if not path.name.endswith(".tmp")
+            for stat in [path.stat()]
+        ]
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, path in sorted(entries):
+            if total <= self.limit:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed.append(path)
+        return removed
+
+
+test_cache = """
+>>> import contextlib, io, tempfile
+>>> import markov_gen
+>>> with tempfile.TemporaryDirectory() as directory:
+...     cache_dir = Path(directory) / "cache"
+...     output = Path(directory) / "sample.csv"
+...     argv = ["-s", "200", "-r", "7", "-o", str(output), "--cache", str(cache_dir)]
+...     with contextlib.redirect_stdout(io.StringIO()):
+...         markov_gen.main(argv)
+...         first = output.read_bytes()
+...         output.unlink()
+...         markov_gen.main(argv)
+...     entries = list(cache_dir.glob("??/*"))
+...     key = ResultCache.key(markov_gen.get_options(argv), markov_gen.VERSION)
+...     print(output.read_bytes() == first, entries == [ResultCache(cache_dir).path(key)])
+...     cache = ResultCache(cache_dir, limit=len(first))
+...     other = argparse.Namespace(samples=100, randomize=8, output=output.with_name("other.csv"))
+...     with other.output.open("w") as target:
+...         markov_gen.write_samples(target, other)
+...     cache.store(ResultCache.key(other, markov_gen.VERSION), other.output)
+...     print([path.name for path in cache_dir.glob("??/*")] == [ResultCache.key(other, markov_gen.VERSION)])
+True True
+True
+"""
+
+test_store_copies = """
+The output doesn't share an inode with a new entry, and a run without
+the cache doesn't write through a hard link from a cache hit.
+
+>>> import contextlib, io, stat, tempfile
+>>> import markov_gen
+>>> with tempfile.TemporaryDirectory() as directory:
+...     cache_dir = Path(directory) / "cache"
+...     output = Path(directory) / "o.csv"
+...     cached = ["-s", "100", "-r", "3", "-o", str(output), "--cache", str(cache_dir)]
+...     with contextlib.redirect_stdout(io.StringIO()):
+...         markov_gen.main(cached)
+...         stored = output.stat()
+...         first = output.read_bytes()
+...         markov_gen.main(["-s", "100", "-r", "4", "-o", str(output)])
+...         markov_gen.main(cached)
+...     print(stored.st_nlink, stat.S_IMODE(stored.st_mode) & 0o200 != 0)
+...     print(output.read_bytes() == first)
+1 True
+True
+
+A hit is a writable file of its own. Writing to it in place, as any
+other program might, leaves the cache entry as it was.
+
+>>> with tempfile.TemporaryDirectory() as directory:
+...     cache_dir = Path(directory) / "cache"
+...     output = Path(directory) / "o.csv"
+...     cached = ["-s", "100", "-r", "3", "-o", str(output), "--cache", str(cache_dir)]
+...     with contextlib.redirect_stdout(io.StringIO()):
+...         markov_gen.main(cached)
+...         first = output.read_bytes()
+...         markov_gen.main(cached)
+...     fetched = output.stat()
+...     with output.open("w") as target:
+...         _ = target.write("overwritten by another tool\\n")
+...     (entry,) = cache_dir.glob("??/*")
+...     print(fetched.st_nlink, stat.S_IMODE(fetched.st_mode) & 0o200 != 0, entry.read_bytes() == first)
+...     output.unlink()
+...     with contextlib.redirect_stdout(io.StringIO()):
+...         markov_gen.main(cached)
+...     print(output.read_bytes() == first)
+1 True True
+True
+"""
+
+__test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
@@ -0,0 +1,343 @@
+"""
+Python Cookbook, 3rd Ed.
+
+Chapter 14, Application Integration: Combination
+Markov Generator, coordinator and worker nodes
+
+The coordinator serves a queue of (seed, start, stop) tasks with
+``multiprocessing.managers``. Workers on any host connect over TCP,
+lease a task, summarize that range of the split streams, and send the
+partial summary back. A lease that isn't completed in time, because the
+worker died or the host went away, goes back on the queue.
+
+Since any range of the split streams can be generated independently,
+the result is the same as ``recipe_01.split_summaries()``, however the tasks
+are spread over the workers, and even if some tasks are run twice.
+
+On the coordinator host::
+
+    python markov_cluster.py coordinator -a 0.0.0.0:50000 -s 1000000000
+
+On each worker host::
+
+    python markov_cluster.py worker -a coordinator-host:50000
+
+Both ends need the same ``MARKOV_AUTHKEY`` environment variable; neither
+will start without it. The manager unpickles whatever an authenticated
+peer sends, so the key is what keeps other hosts from running code on the
+coordinator. Use a long random key, and a trusted network. The coordinator
+listens on the loopback interface unless it's given an address.
+"""
+import argparse
+from collections import deque
+import multiprocessing
+from multiprocessing.managers import BaseManager
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Callable, TypeAlias, cast
+
+import markov_gen
+import markov_summ_2
+
+Task: TypeAlias = tuple[int, int, int, int]
+Address: TypeAlias = tuple[str, int]
+
+# Only for local_cluster(), where every process is on the loopback interface.
+DEFAULT_AUTHKEY = b"markov"
+
+
+class Coordinator:
+    """
+    The task queue. Each task is (task_id, seed, start, stop).
+    A task is leased to one worker at a time; when the lease expires,
+    the task is queued again. The first summary for a task is kept.
+    """
+
+    def __init__(self, lease_seconds: float = 60.0) -> None:
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+        self.tasks: dict[int, Task] = {}
+        self.pending: deque[int] = deque()
+        self.leases: dict[int, tuple[str, float]] = {}
+        self.summaries: dict[int, markov_summ_2.Summary] = {}
+        self.requeued = 0
+        self.completed_by: dict[str, int] = {}
+
+    def submit(self, tasks: list[Task]) -> None:
+        with self.lock:
+            for task in tasks:
+                self.tasks[task[0]] = task
+                self.pending.append(task[0])
+
+    def lease(self, worker: str) -> Task | None:
+        """The next task for this worker, or None if none is available now."""
+        with self.lock:
+            now = time.monotonic()
+            for task_id, (_, deadline) in list(self.leases.items()):
+                if deadline < now:
+                    del self.leases[task_id]
+                    self.pending.append(task_id)
+                    self.requeued += 1
+            while self.pending:
+                task_id = self.pending.popleft()
+                if task_id not in self.summaries:
+                    self.leases[task_id] = (worker, now + self.lease_seconds)
+                    return self.tasks[task_id]
+            return None
+
+    def complete(self, worker: str, task_id: int, summary: markov_summ_2.Summary) -> None:
+        with self.lock:
+            self.leases.pop(task_id, None)
+            if task_id not in self.summaries:
+                self.summaries[task_id] = summary
+                self.completed_by[worker] = self.completed_by.get(worker, 0) + 1
+
+    def finished(self) -> bool:
+        with self.lock:
+            return len(self.summaries) == len(self.tasks)
+
+    def results(self) -> list[markov_summ_2.Summary]:
+        """The partial summaries, in task order."""
+        with self.lock:
+            return [self.summaries[task_id] for task_id in sorted(self.summaries)]
+
+    def status(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "tasks": len(self.tasks),
+                "completed": len(self.summaries),
+                "leased": len(self.leases),
+                "requeued": self.requeued,
+                "workers": dict(self.completed_by),
+            }
+
+
+# There's one Coordinator in the manager's server process.
+_coordinator: Coordinator | None = None
+
+
+def shared_coordinator(lease_seconds: float = 60.0) -> Coordinator:
+    global _coordinator
+    if _coordinator is None:
+        _coordinator = Coordinator(lease_seconds)
+    return _coordinator
+
+
+class ClusterManager(BaseManager):
+    coordinator: Callable[..., Coordinator]
+
+
+ClusterManager.register("coordinator", callable=shared_coordinator)
+
+
+def make_tasks(samples: int, seed: int, chunk: int) -> list[Task]:
+    """
+    >>> make_tasks(2_500, 42, 1_000)
+    [(0, 42, 0, 1000), (1, 42, 1000, 2000), (2, 42, 2000, 2500)]
+    """
+    return [
+        (task_id, seed, start, min(start + chunk, samples))
+        for task_id, start in enumerate(range(0, samples, chunk))
+    ]
+
+
+def run_task(task: Task) -> markov_summ_2.Summary:
+    _, seed, start, stop = task
+    return markov_summ_2.summarize(markov_gen.split_chains(seed, start, stop))
+
+
+def run_worker(
+    address: Address,
+    authkey: bytes,
+    name: str | None = None,
+    poll: float = 0.1,
+    crash_after: int | None = None,
+) -> int:
+    """
+    Lease and run tasks until the coordinator is finished or goes away.
+    Returns the number of tasks completed.
+
+    ``crash_after`` makes the worker exit abruptly, holding a lease,
+    after that many tasks; it's for testing.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    manager = ClusterManager(address=address, authkey=authkey)
+    manager.connect()
+    coordinator = manager.coordinator()
+    completed = 0
+    try:
+        while not coordinator.finished():
+            task = coordinator.lease(name)
+            if task is None:
+                time.sleep(poll)
+                continue
+            if crash_after is not None and completed >= crash_after:
+                os._exit(1)
+            coordinator.complete(name, task[0], run_task(task))
+            completed += 1
+    except (EOFError, ConnectionError):
+        # The coordinator has shut down.
+        pass
+    return completed
+
+
+def run_coordinator(
+    samples: int,
+    seed: int,
+    chunk: int,
+    authkey: bytes,
+    address: Address = ("127.0.0.1", 0),
+    lease_seconds: float = 60.0,
+    poll: float = 0.1,
+    started: Callable[[Address], None] | None = None,
+) -> tuple[markov_summ_2.Summary, dict[str, Any]]:
+    """
+    Serve the tasks until every one has a summary. ``started`` is called
+    with the listening address, once workers can connect.
+    Returns the merged summary and the coordinator's final status.
+    """
+    manager = ClusterManager(address=address, authkey=authkey)
+    manager.start()
+    try:
+        coordinator = manager.coordinator(lease_seconds)
+        coordinator.submit(make_tasks(samples, seed, chunk))
+        if started:
+            started(cast(Address, manager.address))
+        while not coordinator.finished():
+            time.sleep(poll)
+        summary = markov_summ_2.tree_reduce(coordinator.results())
+        status = coordinator.status()
+    finally:
+        manager.shutdown()
+    return summary, status
+
+
+def local_cluster(
+    samples: int,
+    seed: int,
+    chunk: int,
+    nodes: int = 3,
+    lease_seconds: float = 60.0,
+    crash_after: dict[int, int] | None = None,
+) -> tuple[markov_summ_2.Summary, dict[str, Any]]:
+    """
+    A coordinator with ``nodes`` local worker processes, connected over
+    the loopback interface, as a stand-in for several hosts.
+    ``crash_after`` maps a node number to the number of tasks it
+    completes before it dies.
+    """
+    crash_after = crash_after or {}
+    workers: list[multiprocessing.Process] = []
+
+    def start_workers(address: Address) -> None:
+        for node in range(nodes):
+            worker = multiprocessing.Process(
+                target=run_worker,
+                args=(address, DEFAULT_AUTHKEY, f"node-{node}"),
+                kwargs={"crash_after": crash_after.get(node)},
+            )
+            worker.start()
+            workers.append(worker)
+
+    try:
+        return run_coordinator(
+            samples,
+            seed,
+            chunk,
+            DEFAULT_AUTHKEY,
+            lease_seconds=lease_seconds,
+            started=start_workers,
+        )
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+
+def parse_address(text: str) -> Address:
+    host, _, port = text.rpartition(":")
+    return host, int(port)
+
+
+def get_options(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Distributed Markov Chain Summary")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+    coordinator = subparsers.add_parser("coordinator")
+    coordinator.add_argument("-a", "--address", type=parse_address, default=("127.0.0.1", 50000))
+    coordinator.add_argument("-s", "--samples", type=int, default=1_000_000)
+    coordinator.add_argument("-r", "--randomize", type=int, default=1)
+    coordinator.add_argument("-c", "--chunk", type=int, default=100_000)
+    coordinator.add_argument("-l", "--lease", type=float, default=60.0)
+    worker = subparsers.add_parser("worker")
+    worker.add_argument("-a", "--address", type=parse_address, required=True)
+    worker.add_argument("-p", "--processes", type=int, default=os.cpu_count() or 1)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = sys.argv[1:]) -> None:
+    options = get_options(argv)
+    authkey = os.environ.get("MARKOV_AUTHKEY", "").encode()
+    if not authkey:
+        sys.exit("MARKOV_AUTHKEY must be set, to the same key on every host")
+    if options.role == "coordinator":
+        summary, status = run_coordinator(
+            options.samples,
+            options.randomize,
+            options.chunk,
+            authkey,
+            address=options.address,
+            lease_seconds=options.lease,
+            started=lambda address: print(f"Serving {address}", file=sys.stderr),
+        )
+        print(f"# status = {status}")
+        markov_summ_2.write_report(*summary)
+    else:
+        workers = [
+            multiprocessing.Process(target=run_worker, args=(options.address, authkey))
+            for _ in range(options.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
+
+
+test_local_cluster = """
+>>> import recipe_01
+>>> summary, status = local_cluster(20_000, 42, 1_000, nodes=3)
+>>> summary == recipe_01.split_summaries(20_000, 42, 1_000, workers=2)
+True
+>>> status["completed"], status["requeued"], sum(status["workers"].values())
+(20, 0, 20)
+
+One node dies holding a lease; its task is run again by another node.
+
+>>> summary, status = local_cluster(
+...     50_000, 42, 1_000, nodes=3, lease_seconds=0.5, crash_after={0: 0}
+... )
+>>> summary == recipe_01.split_summaries(50_000, 42, 1_000, workers=2)
+True
+>>> status["completed"], status["requeued"] >= 1, sorted(status["workers"])
+(50, True, ['node-1', 'node-2'])
+
+Neither end starts without ``MARKOV_AUTHKEY``.
+
+>>> from unittest import mock
+>>> with mock.patch.dict(os.environ, {"MARKOV_AUTHKEY": ""}):
+...     main(["worker", "-a", "127.0.0.1:50000"])
+Traceback (most recent call last):
+...
+SystemExit: MARKOV_AUTHKEY must be set, to the same key on every host
+>>> get_options(["coordinator"]).address
+('127.0.0.1', 50000)
+"""
+
+__test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
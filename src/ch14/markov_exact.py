@@ -0,0 +1,239 @@
+"""
+Python Cookbook, 3rd Ed.
+
+Chapter 14, Application Integration: Combination
+Markov Exact Distribution
+
+The chains are an absorbing Markov chain. The transient states are ``START``
+and the points; the absorbing states are ``SUCCEED`` and ``FAIL``.
+The transition probabilities come from ``markov_gen.TRANSITIONS`` and the
+probability of each roll of two dice, so this always matches the generator.
+"""
+import argparse
+from collections import Counter
+from fractions import Fraction
+import math
+from pathlib import Path
+import sys
+from typing import NamedTuple, TypeAlias
+
+import markov_gen
+import markov_summ_2
+
+Matrix: TypeAlias = list[list[Fraction]]
+
+ROLLS = {roll: Fraction(6 - abs(roll - 7), 36) for roll in range(2, 13)}
+OUTCOMES = {"Success": markov_gen.SUCCEED, "Fail": markov_gen.FAIL}
+
+
+def transient_states() -> list[int]:
+    points = sorted(
+        {markov_gen.TRANSITIONS[markov_gen.START][roll] for roll in ROLLS}
+        - {markov_gen.SUCCEED, markov_gen.FAIL}
+    )
+    return [markov_gen.START] + points
+
+
+def transition_matrix() -> tuple[list[int], Matrix, Matrix]:
+    """
+    The canonical form of the absorbing chain: the transient states,
+    Q (transient to transient), and R (transient to Success, Fail).
+    """
+    states = transient_states()
+    index = {state: i for i, state in enumerate(states)}
+    q = [[Fraction(0)] * len(states) for _ in states]
+    r = [[Fraction(0)] * len(OUTCOMES) for _ in states]
+    absorbing = {state: j for j, state in enumerate(OUTCOMES.values())}
+    for i, state in enumerate(states):
+        for roll, p in ROLLS.items():
+            target = markov_gen.TRANSITIONS[state][roll]
+            if target in absorbing:
+                r[i][absorbing[target]] += p
+            else:
+                q[i][index[target]] += p
+    return states, q, r
+
+
+def solve(a: Matrix, b: Matrix) -> Matrix:
+    """Gauss-Jordan elimination for ``a x = b``, exactly."""
+    n = len(a)
+    rows = [a[i][:] + b[i][:] for i in range(n)]
+    for col in range(n):
+        pivot = next(i for i in range(col, n) if rows[i][col] != 0)
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        head = rows[col][col]
+        rows[col] = [x / head for x in rows[col]]
+        for i in range(n):
+            if i != col and rows[i][col] != 0:
+                factor = rows[i][col]
+                rows[i] = [x - factor * y for x, y in zip(rows[i], rows[col])]
+    return [row[n:] for row in rows]
+
+
+def outcome_probabilities() -> dict[str, Fraction]:
+    """
+    The absorption probabilities from ``START``: B = (I - Q)⁻¹ R.
+
+    >>> outcome_probabilities()
+    {'Success': Fraction(244, 495), 'Fail': Fraction(251, 495)}
+    """
+    states, q, r = transition_matrix()
+    identity_minus_q = [
+        [Fraction(int(i == j)) - q[i][j] for j in range(len(states))]
+        for i in range(len(states))
+    ]
+    b = solve(identity_minus_q, r)
+    start = states.index(markov_gen.START)
+    return {outcome: b[start][j] for j, outcome in enumerate(OUTCOMES)}
+
+
+def length_distribution(cutoff: int = 50) -> dict[str, dict[int, Fraction]]:
+    """
+    The probability of each (outcome, length) for lengths up to ``cutoff``.
+    The remaining probability for each outcome is under the key ``cutoff + 1``.
+
+    >>> dist = length_distribution(3)
+    >>> dist["Success"][1], dist["Fail"][1]
+    (Fraction(2, 9), Fraction(1, 9))
+    >>> sum(sum(d.values()) for d in dist.values())
+    Fraction(1, 1)
+    """
+    states, q, r = transition_matrix()
+    distribution = [Fraction(int(state == markov_gen.START)) for state in states]
+    result: dict[str, dict[int, Fraction]] = {outcome: {} for outcome in OUTCOMES}
+    for length in range(1, cutoff + 1):
+        for j, outcome in enumerate(OUTCOMES):
+            result[outcome][length] = sum(
+                (p * r[i][j] for i, p in enumerate(distribution)), Fraction(0)
+            )
+        distribution = [
+            sum((p * q[i][k] for i, p in enumerate(distribution)), Fraction(0))
+            for k in range(len(states))
+        ]
+    totals = outcome_probabilities()
+    for outcome in OUTCOMES:
+        result[outcome][cutoff + 1] = totals[outcome] - sum(result[outcome].values())
+    return result
+
+
+def chi2_sf(statistic: float, dof: int) -> float:
+    """
+    Upper tail of the chi-square distribution, from the regularized
+    incomplete gamma function.
+
+    >>> round(chi2_sf(3.841, 1), 3), round(chi2_sf(18.307, 10), 3)
+    (0.05, 0.05)
+    """
+    a, x = dof / 2, statistic / 2
+    if x <= 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Series for the lower tail.
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return 1 - total * math.exp(log_prefix)
+    # Continued fraction (Lentz) for the upper tail.
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1_000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+
+class Fit(NamedTuple):
+    statistic: float
+    dof: int
+    p_value: float
+
+
+def goodness_of_fit(
+    lengths: dict[str, Counter[int]], cutoff: int = 50, minimum: float = 5.0
+) -> Fit:
+    """
+    Pearson's chi-square test of observed (outcome, length) counts against
+    the exact distribution. Cells with an expected count below ``minimum``
+    are pooled. Raises ValueError if that leaves fewer than two cells,
+    because there are too few samples to test.
+
+    >>> dice = markov_gen.Dice(42)
+    >>> outcomes, lengths = markov_summ_2.summarize(
+    ...     markov_gen.make_chain(dice) for _ in range(20_000)
+    ... )
+    >>> goodness_of_fit(lengths).p_value > 0.01
+    True
+    >>> biased = {"Success": lengths["Success"] + lengths["Fail"], "Fail": Counter()}
+    >>> goodness_of_fit(biased).p_value < 1e-9
+    True
+    >>> goodness_of_fit({"Success": Counter({1: 20}), "Fail": Counter()})
+    Traceback (most recent call last):
+    ...
+    ValueError: 20 samples give 1 cell(s) after pooling; at least 2 are needed
+    """
+    total = sum(counts.total() for counts in lengths.values())
+    observed_pool = expected_pool = 0.0
+    statistic = 0.0
+    cells = 0
+    for outcome, distribution in length_distribution(cutoff).items():
+        counts = lengths.get(outcome, Counter())
+        tail = sum(n for length, n in counts.items() if length > cutoff)
+        for length, p in distribution.items():
+            observed = tail if length > cutoff else counts.get(length, 0)
+            expected = total * float(p)
+            if expected < minimum:
+                observed_pool += observed
+                expected_pool += expected
+            else:
+                statistic += (observed - expected) ** 2 / expected
+                cells += 1
+    if expected_pool > 0:
+        statistic += (observed_pool - expected_pool) ** 2 / expected_pool
+        cells += 1
+    dof = cells - 1
+    if dof < 1:
+        raise ValueError(
+            f"{total} samples give {cells} cell(s) after pooling; at least 2 are needed"
+        )
+    return Fit(statistic, dof, chi2_sf(statistic, dof))
+
+
+def main(argv: list[str] = sys.argv[1:]) -> None:
+    parser = argparse.ArgumentParser(description="Exact Markov chain distribution")
+    parser.add_argument("-c", "--cutoff", type=int, default=50)
+    parser.add_argument("data", nargs="*", type=Path)
+    options = parser.parse_args(argv)
+
+    print("## Exact Outcomes")
+    for outcome, p in outcome_probabilities().items():
+        print(f"{outcome:8s} {p} = {float(p):.6f}")
+    if options.data:
+        _, lengths = markov_summ_2.process_files(options.data)
+        print()
+        print("## Goodness of Fit")
+        try:
+            fit = goodness_of_fit(lengths, options.cutoff)
+        except ValueError as ex:
+            print(f"Not tested: {ex}")
+            return
+        print(f"chi2 = {fit.statistic:.3f}, dof = {fit.dof}, p = {fit.p_value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,34 @@ Chapter 14, Application Integration: Combination
 Markov Generator
 """
 import argparse
-from collections.abc import Callable
+from array import array
+import bz2
+from collections import Counter, deque
+from collections.abc import Callable, Iterator
+from concurrent import futures
 from contextlib import redirect_stdout
 import csv
 from functools import partial
+import hashlib
+import io
+import json
+import lzma
 import os
 from pathlib import Path
 import random
+import struct
 import sys
 from textwrap import dedent
-from typing import TypeAlias, Any, TextIO
+import zlib
+from typing import TYPE_CHECKING, TypeAlias, Any, BinaryIO, IO, NamedTuple, TextIO, cast
+
+import markov_cache
+
+if TYPE_CHECKING:
+    from markov_batch import Batch
+
+# Change this whenever a seeded run's output changes.
+VERSION = "1"
 
 Chain: TypeAlias = list[int]
 State: TypeAlias = Callable[[Chain, int], tuple[Chain, Any]]
@@ -64,7 +82,40 @@ class Dice:
         return self.dice
 
 
-def make_chain(dice: Dice) -> tuple[str, Chain]:
+# Split streams. Sample ``i`` of a root seed always comes from block
+# ``i // STREAM_BLOCK``, which has its own Dice, seeded from a hash of the
+# root seed and the block number. Any range of samples can be generated
+# independently, so results don't depend on how the work is divided.
+
+STREAM_BLOCK = 1_024
+
+
+def stream_seed(root: int, block: int) -> int:
+    """A child seed for one block, derived from the root seed."""
+    digest = hashlib.sha256(f"markov_gen:{root}:{block}".encode("utf-8")).digest()
+    return int.from_bytes(digest, "big")
+
+
+def split_chains(root: int, start: int, stop: int) -> Iterator[tuple[str, Chain]]:
+    """
+    Samples ``start`` to ``stop`` of the split stream for a root seed.
+
+    >>> whole = list(split_chains(42, 0, 3_000))
+    >>> pieces = [split_chains(42, start, start + 700) for start in range(0, 3_000, 700)]
+    >>> whole == [sample for piece in pieces for sample in piece][:3_000]
+    True
+    """
+    for block in range(start // STREAM_BLOCK, -(-stop // STREAM_BLOCK)):
+        dice = Dice(stream_seed(root, block))
+        first = block * STREAM_BLOCK
+        for index in range(first, min(first + STREAM_BLOCK, stop)):
+            sample = make_chain(dice)
+            if index >= start:
+                yield sample
+
+
+def make_chain_states(dice: Dice) -> tuple[str, Chain]:
+    """The state-function version: one exception per chain."""
     state: State = start
     chain: Chain = []
     try:
@@ -77,6 +128,59 @@ def make_chain(dice: Dice) -> tuple[str, Chain]:
         return ("Fail", chain)
 
 
+# Table-driven engine. The states are START, a point (4, 5, 6, 8, 9, 10),
+# or one of the two terminal states.
+START = 0
+SUCCEED = -1
+FAIL = -2
+OUTCOMES = {SUCCEED: "Success", FAIL: "Fail"}
+Transitions: TypeAlias = list[list[int]]
+
+
+def compile_transitions() -> Transitions:
+    """
+    Build the transition table, indexed by ``[state][roll]``,
+    by evaluating the state functions once for each (state, roll) pair.
+    """
+
+    def next_state(state: State, roll: int) -> int:
+        _, target = state([], roll)
+        if target is succeed:
+            return SUCCEED
+        elif target is fail:
+            return FAIL
+        else:
+            return cast(int, cast(partial[Any], target).args[0])
+
+    table: Transitions = [[FAIL] * 13 for _ in range(13)]
+    rolls = range(2, 13)
+    for roll in rolls:
+        table[START][roll] = next_state(start, roll)
+    points = {table[START][roll] for roll in rolls} - {SUCCEED, FAIL}
+    for point in points:
+        for roll in rolls:
+            table[point][roll] = next_state(partial(grow_until, point), roll)
+    return table
+
+
+TRANSITIONS = compile_transitions()
+
+
+def make_chain(dice: Dice) -> tuple[str, Chain]:
+    chain: Chain = []
+    append = chain.append
+    transitions = TRANSITIONS
+    state = START
+    while state >= 0:
+        roll = sum(dice.roll())
+        append(roll)
+        state = transitions[state][roll]
+    # The terminal state functions consume one more roll before raising.
+    # Discard a roll here, also, so a seeded Dice yields the same chains.
+    dice.roll()
+    return (OUTCOMES[state], chain)
+
+
 class Writer:
     def __init__(self, target: TextIO | None = None) -> None:
         self.target = target
@@ -87,22 +191,122 @@ class Writer:
     def sample(self, outcome: str, chain: list[int]) -> None:
         ...
 
+    def batch(self, batch: "Batch") -> None:
+        """All the chains from the NumPy engine. Subclasses can use the arrays."""
+        for outcome, chain in batch.chains():
+            self.sample(outcome, chain)
+
+    def close(self) -> None:
+        ...
+
+
+# The CSV trailer. After the rows, ``close()`` writes the summary of the rows,
+# so a reader can skip parsing them:
+#
+#     # =====
+#     # summary = {"rows": ..., "crc32": ..., "outcomes": ..., "lengths": ...}
+#     # trailer = 000000012345 000000012456
+#
+# The last line has a fixed size. It has the offset of the ``# =====`` line
+# and the size of the whole file, both in bytes. The CRC32 covers the
+# UTF-8 text from the column titles through the last row.
+
+TRAILER_MARK = "# ====="
+ROLL_TEXT = [str(roll) for roll in range(13)]
+TRAILER_SIZE = len("# trailer = 000000000000 000000000000\n")
+
+
+class Tally:
+    """A text target that counts the UTF-8 bytes written, with their CRC32."""
+
+    def __init__(self, target: TextIO) -> None:
+        self.target = target
+        self.size = 0
+        self.crc = 0
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8")
+        self.size += len(data)
+        self.crc = zlib.crc32(data, self.crc)
+        return self.target.write(text)
+
 
 class CSVWriter(Writer):
     def __init__(self, target: TextIO | None = None) -> None:
-        super().__init__(target)
+        super().__init__(cast(TextIO, Tally(target)) if target else None)
+        self.outcomes: Counter[str] = Counter()
+        self.lengths: dict[str, Counter[int]] = {"Fail": Counter(), "Success": Counter()}
 
     def header(self, opts: argparse.Namespace, columns: bool = True) -> None:
         print(f'# file = "{opts.output}"', file=self.target)
         print(f"# samples = {opts.samples}", file=self.target)
         print(f"# randomize = {opts.randomize}", file=self.target)
+        if getattr(opts, "engine", "table") != "table":
+            print(f"# engine = {opts.engine}", file=self.target)
+        if getattr(opts, "offset", None) is not None:
+            print(f"# offset = {opts.offset}", file=self.target)
         if columns and self.target:
             print("# -----", file=self.target)
-            self.writer = csv.writer(self.target)
+            self.rows = Tally(self.target)
+            self.writer = csv.writer(self.rows)
             self.writer.writerow(["outcome", "length", "chain"])
 
     def sample(self, outcome: str, chain: list[int]) -> None:
         self.writer.writerow([outcome, len(chain), ";".join(map(str, chain))])
+        self.outcomes[outcome] += 1
+        self.lengths.setdefault(outcome, Counter())[len(chain)] += 1
+
+    def batch(self, batch: "Batch") -> None:
+        import numpy as np
+
+        # One string of all the rolls, each followed by ";". A chain's
+        # text is a slice of it, found from the character offsets.
+        rolls = batch.rolls.tolist()
+        text = ";".join(map(ROLL_TEXT.__getitem__, rolls)) + ";"
+        widths = np.where(batch.rolls >= 10, 3, 2)
+        positions = np.zeros(len(rolls) + 1, dtype=np.int64)
+        np.cumsum(widths, out=positions[1:])
+        bounds = positions[batch.offsets].tolist()
+        names = np.where(batch.outcomes, "Success", "Fail").tolist()
+        self.writer.writerows(
+            zip(
+                names,
+                batch.lengths.tolist(),
+                (text[start : end - 1] for start, end in zip(bounds, bounds[1:])),
+            )
+        )
+        # Counted in order of first appearance, as sample() would,
+        # so the trailer is the same.
+        groups = []
+        for outcome, chosen in ("Success", batch.outcomes), ("Fail", ~batch.outcomes):
+            (where,) = np.nonzero(chosen)
+            if len(where):
+                values, first, counts = np.unique(
+                    batch.lengths[where], return_index=True, return_counts=True
+                )
+                order = np.argsort(first)
+                groups.append((int(where[0]), outcome, values[order], counts[order]))
+        for _, outcome, values, counts in sorted(groups, key=lambda group: group[0]):
+            self.outcomes[outcome] += int(counts.sum())
+            self.lengths.setdefault(outcome, Counter()).update(
+                dict(zip(values.tolist(), counts.tolist()))
+            )
+
+    def close(self) -> None:
+        if not hasattr(self, "writer"):
+            return
+        tally = cast(Tally, self.target)
+        summary = {
+            "rows": self.outcomes.total(),
+            "crc32": self.rows.crc,
+            "outcomes": self.outcomes,
+            "lengths": self.lengths,
+        }
+        block = f"{TRAILER_MARK}\n# summary = {json.dumps(summary)}\n"
+        offset = tally.size
+        size = offset + len(block.encode("utf-8")) + TRAILER_SIZE
+        tally.write(block)
+        tally.write(f"# trailer = {offset:012d} {size:012d}\n")
 
 
 class TOMLWriter(Writer):
@@ -124,17 +328,299 @@ class TOMLWriter(Writer):
             print(f"  chain = {chain}")
 
 
-def write_samples(target_file: TextIO, opts: argparse.Namespace) -> None:
+# Binary chain file layout. All values are little-endian.
+#
+# -   The fixed header: magic, version, metadata size, sample count, roll count.
+# -   The metadata text, the same ``# name = value`` lines as the CSV header.
+# -   The outcomes, packed 8 per byte, least-significant bit first; 1 is Success.
+# -   The chain lengths, one uint16 per sample.
+# -   The rolls, one uint8 per roll. Chain ``i`` starts at the sum of
+#     the first ``i`` lengths.
+#
+# The outcomes and lengths sections start on even offsets.
+
+BINARY_SUFFIX = ".chains"
+BINARY_MAGIC = b"MKCH"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHHIQQ")
+
+
+def _even(offset: int) -> int:
+    return offset + (offset & 1)
+
+
+class BinaryWriter(Writer):
+    """
+    Accumulates the samples and writes the binary container on ``close()``.
+    """
+
+    def __init__(self, target: BinaryIO | None = None) -> None:
+        super().__init__(None)
+        self.binary_target = target
+        self.metadata = ""
+        self.count = 0
+        self.outcomes = bytearray()
+        self.lengths = array("H")
+        self.rolls = array("B")
+
+    def header(self, opts: argparse.Namespace, columns: bool = True) -> None:
+        buffer = io.StringIO()
+        CSVWriter(buffer).header(opts, columns=False)
+        self.metadata = buffer.getvalue()
+
+    def sample(self, outcome: str, chain: list[int]) -> None:
+        bit = self.count % 8
+        if bit == 0:
+            self.outcomes.append(0)
+        if outcome == "Success":
+            self.outcomes[-1] |= 1 << bit
+        self.count += 1
+        self.lengths.append(len(chain))
+        self.rolls.extend(chain)
+
+    def batch(self, batch: "Batch") -> None:
+        import numpy as np
+
+        if self.count % 8:
+            super().batch(batch)
+            return
+        self.outcomes += np.packbits(batch.outcomes, bitorder="little").tobytes()
+        self.count += len(batch)
+        # Native order here; close() puts the lengths in little-endian order.
+        self.lengths.frombytes(batch.lengths.astype("=u2").tobytes())
+        self.rolls.frombytes(batch.rolls.tobytes())
+
+    def close(self) -> None:
+        if self.binary_target is None:
+            return
+        metadata = self.metadata.encode("utf-8")
+        lengths = array("H", self.lengths)
+        if sys.byteorder != "little":
+            lengths.byteswap()
+        target = self.binary_target
+        offset = target.write(
+            BINARY_HEADER.pack(
+                BINARY_MAGIC,
+                BINARY_VERSION,
+                0,
+                len(metadata),
+                self.count,
+                len(self.rolls),
+            )
+        )
+        offset += target.write(metadata)
+        offset += target.write(bytes(_even(offset) - offset))
+        offset += target.write(self.outcomes)
+        offset += target.write(bytes(_even(offset) - offset))
+        target.write(lengths.tobytes())
+        target.write(self.rolls.tobytes())
+
+
+class ChainFile(NamedTuple):
+    """
+    Views of the sections of a binary chain file.
+    The ``lengths`` are a memoryview cast to uint16.
+    """
+
+    metadata: str
+    samples: int
+    outcomes: memoryview
+    lengths: memoryview
+    rolls: memoryview
+
+
+def read_chains(buffer: memoryview) -> ChainFile:
+    """
+    Locate the sections of a binary chain file without copying them.
+
+    >>> target = io.BytesIO()
+    >>> writer = BinaryWriter(target)
+    >>> writer.header(argparse.Namespace(output="x.chains", samples=2, randomize=1))
+    >>> writer.sample("Success", [7])
+    >>> writer.sample("Fail", [4, 6, 7])
+    >>> writer.close()
+    >>> chains = read_chains(memoryview(target.getvalue()))
+    >>> print(chains.metadata, end="")
+    # file = "x.chains"
+    # samples = 2
+    # randomize = 1
+    >>> chains.samples, bytes(chains.outcomes), chains.lengths.tolist(), chains.rolls.tolist()
+    (2, b'\\x01', [1, 3], [7, 4, 6, 7])
+    """
+    magic, version, _, meta_size, count, roll_count = BINARY_HEADER.unpack_from(buffer)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError(f"not a version {BINARY_VERSION} chain file")
+    offset = BINARY_HEADER.size
+    metadata = str(buffer[offset : offset + meta_size], "utf-8")
+    outcomes_start = _even(offset + meta_size)
+    outcomes_end = outcomes_start + (count + 7) // 8
+    lengths_start = _even(outcomes_end)
+    rolls_start = lengths_start + 2 * count
+    lengths = buffer[lengths_start:rolls_start]
+    if sys.byteorder == "little":
+        lengths = lengths.cast("H")
+    else:
+        swapped = array("H", lengths.tobytes())
+        swapped.byteswap()
+        lengths = memoryview(swapped)
+    return ChainFile(
+        metadata=metadata,
+        samples=count,
+        outcomes=buffer[outcomes_start:outcomes_end],
+        lengths=lengths,
+        rolls=buffer[rolls_start : rolls_start + roll_count],
+    )
+
+
+def is_binary(opts: argparse.Namespace) -> bool:
+    return bool(opts.output) and Path(opts.output).suffix == BINARY_SUFFIX
+
+
+# Compressed CSV output, chosen by the last suffix: ``samples.csv.gz``.
+# The text is cut into blocks, and each block is compressed as a complete,
+# independent stream (a gzip member, a bz2 or xz stream). The concatenated
+# streams are a valid file for the standard tools, and a reader can
+# decompress the streams in parallel.
+#
+# Each gzip member has an ``MK`` extra subfield with the member's size,
+# so a reader can find the next member without scanning.
+
+COMPRESSION = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+COMPRESSION_BLOCK = 1 << 20
+GZIP_SUBFIELD = b"MK"
+
+
+def compress_block(compression: str, data: bytes) -> bytes:
+    """
+    One complete, independent stream. zlib, bz2, and lzma release the GIL,
+    so these can run on a thread pool.
+
+    >>> import gzip
+    >>> blocks = [compress_block("gzip", b"one\\n"), compress_block("gzip", b"two\\n")]
+    >>> gzip.decompress(b"".join(blocks))
+    b'one\\ntwo\\n'
+    """
+    if compression == "bz2":
+        return bz2.compress(data)
+    if compression == "xz":
+        return lzma.compress(data, format=lzma.FORMAT_XZ)
+    deflate = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = deflate.compress(data) + deflate.flush()
+    # ID1, ID2, CM=deflate, FLG=FEXTRA, MTIME=0, XFL=0, OS=unknown, XLEN=8
+    header = struct.pack("<BBBBIBBH", 0x1F, 0x8B, 8, 4, 0, 0, 255, 8)
+    size = len(header) + 8 + len(body) + 8
+    extra = GZIP_SUBFIELD + struct.pack("<HI", 4, size)
+    trailer = struct.pack("<II", zlib.crc32(data), len(data) & 0xFFFFFFFF)
+    return header + extra + body + trailer
+
+
+class CompressedWriter(io.TextIOBase):
+    """
+    A text file that compresses blocks on a thread pool and writes the
+    streams in order. At most ``2 * workers`` blocks are in flight.
+    """
+
+    def __init__(
+        self,
+        target: BinaryIO,
+        compression: str,
+        block_size: int = COMPRESSION_BLOCK,
+        workers: int | None = None,
+    ) -> None:
+        super().__init__()
+        self.target = target
+        self.compression = compression
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = futures.ThreadPoolExecutor(self.workers)
+        self.pending: deque[futures.Future[bytes]] = deque()
+        self.buffer: list[str] = []
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= self.block_size:
+            self._submit()
+        return len(text)
+
+    def _submit(self) -> None:
+        if self.buffer:
+            data = "".join(self.buffer).encode("utf-8")
+            self.buffer, self.size = [], 0
+            self.pending.append(
+                self.executor.submit(compress_block, self.compression, data)
+            )
+        while len(self.pending) > 2 * self.workers:
+            self.target.write(self.pending.popleft().result())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            self._submit()
+            while self.pending:
+                self.target.write(self.pending.popleft().result())
+        finally:
+            self.executor.shutdown()
+            self.target.close()
+            super().close()
+
+
+def open_output(path: Path) -> IO[Any]:
+    """Open an output file for ``write_samples()``, based on its suffixes."""
+    if path.suffix == BINARY_SUFFIX:
+        return path.open("wb")
+    if path.suffix in COMPRESSION:
+        return cast(IO[Any], CompressedWriter(path.open("wb"), COMPRESSION[path.suffix]))
+    return path.open("w")
+
+
+def sample_iter(opts: argparse.Namespace) -> Iterator[tuple[str, Chain]]:
+    if getattr(opts, "offset", None) is not None:
+        yield from split_chains(
+            int(opts.randomize), opts.offset, opts.offset + opts.samples
+        )
+        return
+
+    if getattr(opts, "engine", "table") == "numpy":
+        yield from make_batch(opts).chains()
+        return
+
     if opts.randomize:
         probe_sequence = Dice(opts.randomize)
     else:
         probe_sequence = Dice()
 
-    writer = CSVWriter(target_file)
-    writer.header(opts, columns=True)
     for i in range(opts.samples):
-        outcome, chain = make_chain(probe_sequence)
-        writer.sample(outcome, chain)
+        yield make_chain(probe_sequence)
+
+
+def make_batch(opts: argparse.Namespace) -> "Batch":
+    # Optional dependency: only imported when the engine is requested.
+    import markov_batch
+
+    seed = int(opts.randomize) if opts.randomize else None
+    return markov_batch.make_chains(opts.samples, seed)
+
+
+def write_samples(target_file: IO[Any], opts: argparse.Namespace) -> None:
+    writer: Writer
+    if is_binary(opts):
+        writer = BinaryWriter(cast(BinaryIO, target_file))
+    else:
+        writer = CSVWriter(cast(TextIO, target_file))
+    writer.header(opts, columns=True)
+    if getattr(opts, "engine", "table") == "numpy" and getattr(opts, "offset", None) is None:
+        # The writers take the arrays, without a list per chain.
+        writer.batch(make_batch(opts))
+    else:
+        for outcome, chain in sample_iter(opts):
+            writer.sample(outcome, chain)
+    writer.close()
 
 
 def get_options(argv: list[str]) -> argparse.Namespace:
@@ -146,7 +632,24 @@ def get_options(argv: list[str]) -> argparse.Namespace:
     parser.add_argument("-s", "--samples", type=int, default=100)
     parser.add_argument("-r", "--randomize", type=int, default=default_seed)
     parser.add_argument("-o", "--output", type=Path, default=None)
+    parser.add_argument(
+        "-e", "--engine", choices=["table", "numpy"], default="table"
+    )
+    parser.add_argument(
+        "--offset", type=int, default=None,
+        help="use the split streams of the root seed, starting at this sample",
+    )
+    parser.add_argument(
+        "-c", "--cache", type=Path, default=os.environ.get("MARKOV_CACHE") or None,
+        help="reuse seeded outputs from this directory",
+    )
+    parser.add_argument(
+        "--cache-limit", type=int, default=markov_cache.DEFAULT_LIMIT,
+        help="the cache size, in bytes",
+    )
     options = parser.parse_args(argv)
+    if options.offset is not None and options.engine != "table":
+        parser.error("--offset requires the table engine")
     return options
 
 
@@ -154,8 +657,17 @@ def main(argv: list[str] = sys.argv[1:]) -> None:
     options = get_options(argv)
 
     if options.output:
-        with options.output.open("w") as target_file:
-            write_samples(target_file, options)
+        cache = key = None
+        if options.cache:
+            cache = markov_cache.ResultCache(options.cache, options.cache_limit)
+            key = cache.key(options, VERSION)
+        if not (cache and key and cache.fetch(key, options.output)):
+            # Replace whatever is there, rather than writing through it.
+            options.output.unlink(missing_ok=True)
+            with open_output(options.output) as target_file:
+                write_samples(target_file, options)
+            if cache and key:
+                cache.store(key, options.output)
         # Summary
         writer = CSVWriter()
         writer.header(options, columns=False)
@@ -165,3 +677,39 @@ def main(argv: list[str] = sys.argv[1:]) -> None:
 
 if __name__ == "__main__":
     main()
+
+
+test_make_chain = """
+>>> TRANSITIONS[START][7] == SUCCEED, TRANSITIONS[START][12] == FAIL
+(True, True)
+>>> TRANSITIONS[START][6], TRANSITIONS[6][6] == SUCCEED, TRANSITIONS[6][7] == FAIL
+(6, True, True)
+
+>>> table_dice, state_dice = Dice(42), Dice(42)
+>>> all(
+...     make_chain(table_dice) == make_chain_states(state_dice)
+...     for _ in range(1_000)
+... )
+True
+"""
+
+test_write_batch = """
+The writers' batch() gives the same bytes as a sample() for each chain.
+
+>>> def written(suffix: str, batched: bool) -> Any:
+...     opts = argparse.Namespace(samples=2_001, randomize=5, output=f"x{suffix}", engine="numpy")
+...     target = io.BytesIO() if suffix == BINARY_SUFFIX else io.StringIO()
+...     writer = BinaryWriter(target) if suffix == BINARY_SUFFIX else CSVWriter(target)
+...     writer.header(opts)
+...     if batched:
+...         writer.batch(make_batch(opts))
+...     else:
+...         for outcome, chain in sample_iter(opts):
+...             writer.sample(outcome, chain)
+...     writer.close()
+...     return target.getvalue()
+>>> [written(suffix, True) == written(suffix, False) for suffix in (".csv", BINARY_SUFFIX)]
+[True, True]
+"""
+
+__test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
@@ -12,6 +12,7 @@
 
 from collections import Counter
 import csv
+from itertools import takewhile
 from pathlib import Path
 
 
@@ -34,7 +35,9 @@ def main() -> None:
                 if "-----" in line:
                     break
                 # print(line.rstrip())
-            reader = csv.DictReader(line_iter)
+            # Stop at the summary trailer
+            rows = takewhile(lambda line: not line.startswith("# ====="), line_iter)
+            reader = csv.DictReader(rows)
             for sample in reader:
                 outcome_counts[sample["outcome"]] += 1
                 lengths[sample["outcome"]][int(sample["length"])] += 1
@@ -9,16 +9,264 @@ Markov Summary (Version 2)
 
 
 import argparse
-from collections import Counter
+import bz2
+import codecs
+from collections import Counter, deque
+from collections.abc import Iterable, Iterator
+from concurrent import futures
 import contextlib
 import csv
+import gzip
+import hashlib
+from itertools import compress, takewhile
+import json
+import lzma
+import mmap
+import os
 from pathlib import Path
+import re
+import struct
 import sys
 import tomllib
-from typing import Any
+import zlib
+from typing import Any, TypeAlias
 
+import markov_gen
+
+Summary: TypeAlias = tuple[Counter[str], dict[str, Counter[int]]]
+
+# One byte per bit, least-significant bit first, for unpacking the outcomes.
+UNPACK_BITS = [bytes((b >> bit) & 1 for bit in range(8)) for b in range(256)]
+
+
+def process_chains(
+    source: Path, outcome_counts: Counter[str], lengths: dict[str, Counter[int]]
+) -> None:
+    """Summarize a binary chain file in place, using memory-mapped views."""
+    with source.open("rb") as source_file:
+        with mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as buffer:
+                chains = markov_gen.read_chains(buffer)
+                flags = b"".join(map(UNPACK_BITS.__getitem__, chains.outcomes))
+                success = Counter(compress(chains.lengths, flags[: chains.samples]))
+                fail = Counter(chains.lengths) - success
+                for view in chains.outcomes, chains.lengths, chains.rolls:
+                    view.release()
+    for outcome, counts in ("Fail", fail), ("Success", success):
+        if counts:
+            outcome_counts[outcome] += counts.total()
+            lengths[outcome].update(counts)
+
+
+# Compressed inputs. See ``markov_gen.compress_block()`` for the layout.
+# The stream starts are found from the gzip ``MK`` subfield, or by a scan
+# for the bz2 and xz stream headers. If a stream doesn't decompress, or a
+# gzip member lacks the subfield, the whole file is decompressed serially.
+
+BZ2_STREAM = re.compile(rb"BZh[1-9](?=\x31\x41\x59\x26\x53\x59|\x17\x72\x45\x38\x50\x90)")
+XZ_STREAM = re.compile(rb"\xfd7zXZ\x00")
+
+
+def stream_starts(compression: str, data: bytes) -> list[int] | None:
+    """The offset of each independent stream, or None if they can't be found."""
+    if compression == "gzip":
+        starts, offset = [], 0
+        while offset < len(data):
+            header = data[offset : offset + 20]
+            if (
+                len(header) < 20
+                or header[:4] != b"\x1f\x8b\x08\x04"
+                or header[12:14] != markov_gen.GZIP_SUBFIELD
+            ):
+                return None
+            starts.append(offset)
+            (size,) = struct.unpack_from("<I", header, 16)
+            offset += size
+        return starts
+    pattern = BZ2_STREAM if compression == "bz2" else XZ_STREAM
+    starts = []
+    for match in pattern.finditer(data):
+        if compression == "xz":
+            # The stream flags are followed by their CRC32.
+            flags = data[match.end() : match.end() + 2]
+            (crc,) = struct.unpack_from("<I", data, match.end() + 2)
+            if zlib.crc32(flags) != crc:
+                continue
+        starts.append(match.start())
+    return starts if starts and starts[0] == 0 else None
+
+
+def decompress_block(compression: str, data: bytes) -> bytes:
+    """Decompress every stream (or gzip member) in ``data``."""
+    if compression == "bz2":
+        return bz2.decompress(data)
+    if compression == "xz":
+        return lzma.decompress(data, format=lzma.FORMAT_XZ)
+    return gzip.decompress(data)
+
+
+def decompressed_blocks(source: Path, workers: int | None = None) -> Iterator[bytes]:
+    """
+    The decompressed content of a file, in order, one stream at a time.
+    The streams are decompressed on a thread pool, at most ``2 * workers``
+    at a time.
+    """
+    compression = markov_gen.COMPRESSION[source.suffix]
+    data = source.read_bytes()
+    starts = stream_starts(compression, data)
+    if starts is None or len(starts) == 1:
+        yield decompress_block(compression, data)
+        return
+    workers = workers or os.cpu_count() or 1
+    bounds = iter(zip(starts, starts[1:] + [len(data)]))
+    pending: deque[futures.Future[bytes]] = deque()
+    produced = 0
+    with futures.ThreadPoolExecutor(workers) as executor:
+        try:
+            for start, end in bounds:
+                pending.append(
+                    executor.submit(decompress_block, compression, data[start:end])
+                )
+                while len(pending) > 2 * workers or (pending and end == len(data)):
+                    block = pending.popleft().result()
+                    yield block
+                    produced += len(block)
+        except (OSError, EOFError, ValueError, lzma.LZMAError):
+            # A false match from the scan: decompress the whole file serially,
+            # and resume after what was already produced.
+            for future in pending:
+                future.cancel()
+            yield decompress_block(compression, data)[produced:]
+
+
+def decompressed_lines(source: Path, workers: int | None = None) -> Iterator[str]:
+    """
+    The lines of a compressed text file. Lines and UTF-8 sequences can
+    cross stream boundaries.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    partial = ""
+    for block in decompressed_blocks(source, workers):
+        lines = (partial + decoder.decode(block)).splitlines(keepends=True)
+        partial = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+        yield from lines
+    partial += decoder.decode(b"", final=True)
+    if partial:
+        yield partial
+
+
+@contextlib.contextmanager
+def open_lines(source: Path) -> Iterator[Iterable[str]]:
+    if source.suffix in markov_gen.COMPRESSION:
+        yield decompressed_lines(source)
+    else:
+        with source.open() as source_file:
+            yield source_file
+
+
+def process_csv(
+    source: Path, outcome_counts: Counter[str], lengths: dict[str, Counter[int]]
+) -> None:
+    """Summarize a CSV file, compressed or not, with the ``csv`` module."""
+    with open_lines(source) as source_file:
+        line_iter = iter(source_file)
+        # Skip past the header
+        for line in line_iter:
+            if "-----" in line:
+                break
+            # print(line.rstrip())
+        rows = takewhile(
+            lambda line: not line.startswith(markov_gen.TRAILER_MARK), line_iter
+        )
+        reader = csv.DictReader(rows)
+        for sample in reader:
+            outcome_counts[sample["outcome"]] += 1
+            lengths[sample["outcome"]][int(sample["length"])] += 1
+
+
+# The fast path for CSV files. A row is an outcome, optionally quoted,
+# a length, and a chain with no quotes, commas, or line breaks inside it.
+# CSV_OTHER finds the first line that isn't a row like that. Once there
+# are none, CSV_ROW only needs to capture the start of each row.
+CSV_COLUMNS = re.compile(rb'("?)outcome\1,("?)length\2,("?)chain\3\r?$')
+CSV_OTHER = re.compile(
+    rb'^(?!("?)(Success|Fail)\1,\d+,(?:"[^"\r\n]*"|[^",\r\n]*)\r?$|\Z)', re.MULTILINE
+)
+CSV_ROW = re.compile(rb'^"?(Success|Fail)"?,(\d+),', re.MULTILINE)
+
+
+def scan_csv(
+    source: Path, outcome_counts: Counter[str], lengths: dict[str, Counter[int]]
+) -> bool:
+    """
+    Summarize a CSV file from a memory-mapped view of its bytes.
+    Only the outcome and length of each row are captured, and they're only
+    decoded once per distinct (outcome, length) pair.
+
+    Returns False, and changes nothing, if any row doesn't match the
+    simple layout; the ``csv`` module is needed for those files.
+    """
+    with source.open("rb") as source_file:
+        if os.fstat(source_file.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            separator = data.find(b"-----")
+            columns = data.find(b"\n", separator) + 1
+            body = data.find(b"\n", columns) + 1
+            if separator < 0 or columns == 0 or body == 0:
+                return False
+            if not CSV_COLUMNS.match(data, columns, body - 1):
+                return False
+            end = data.find(f"\n{markov_gen.TRAILER_MARK}".encode(), body - 1) + 1
+            end = end or len(data)
+            if CSV_OTHER.search(data, body, end):
+                return False
+            matches = Counter(CSV_ROW.findall(data, body, end))
+    for (outcome, length), count in matches.items():
+        name = outcome.decode("ascii")
+        outcome_counts[name] += count
+        lengths[name][int(length)] += count
+    return True
+
+
+TRAILER = re.compile(rb"# trailer = (\d{12}) (\d{12})\n")
+
+
+def read_trailer(source: Path) -> Summary | None:
+    """
+    The summary from a CSV file's trailer, reading only the end of the file.
+    None if there's no trailer, or the file's size doesn't match it.
+    """
+    size = source.stat().st_size
+    if size < markov_gen.TRAILER_SIZE:
+        return None
+    with source.open("rb") as source_file:
+        source_file.seek(size - markov_gen.TRAILER_SIZE)
+        match = TRAILER.fullmatch(source_file.read())
+        if not match or int(match.group(2)) != size:
+            return None
+        offset = int(match.group(1))
+        source_file.seek(offset)
+        block = source_file.read(size - markov_gen.TRAILER_SIZE - offset)
+    mark, _, summary_line = block.decode("utf-8").rstrip("\n").partition("\n")
+    name, _, text = summary_line.partition(" = ")
+    if mark != markov_gen.TRAILER_MARK or name != "# summary":
+        return None
+    summary = json.loads(text)
+    outcome_counts = Counter(summary["outcomes"])
+    if outcome_counts.total() != summary["rows"]:
+        return None
+    lengths = {
+        outcome: Counter({int(k): v for k, v in counts.items()})
+        for outcome, counts in summary["lengths"].items()
+    }
+    return outcome_counts, lengths
+
+
+def process_files(paths: list[Path], jobs: int = 1) -> Summary:
+    if jobs > 1 and len(paths) > 1:
+        return process_files_parallel(paths, jobs)
 
-def process_files(paths: list[Path]) -> tuple[Counter[str], dict[str, Counter[int]]]:
     # In[2]:
 
     outcome_counts: Counter[str] = Counter()
@@ -30,21 +278,163 @@ def process_files(paths: list[Path]) -> tuple[Counter[str], dict[str, Counter[in
     # In[3]:
 
     for source in paths:
-        with source.open() as source_file:
-            line_iter = iter(source_file)
-            # Skip past the header
-            for line in line_iter:
-                if "-----" in line:
-                    break
-                # print(line.rstrip())
-            reader = csv.DictReader(line_iter)
-            for sample in reader:
-                outcome_counts[sample["outcome"]] += 1
-                lengths[sample["outcome"]][int(sample["length"])] += 1
+        if source.suffix == markov_gen.BINARY_SUFFIX:
+            process_chains(source, outcome_counts, lengths)
+            continue
+        if source.suffix in markov_gen.COMPRESSION:
+            process_csv(source, outcome_counts, lengths)
+            continue
+        if trailer := read_trailer(source):
+            outcome_counts.update(trailer[0])
+            for outcome, counts in trailer[1].items():
+                lengths[outcome].update(counts)
+            continue
+        if not scan_csv(source, outcome_counts, lengths):
+            process_csv(source, outcome_counts, lengths)
 
     return outcome_counts, lengths
 
 
+def summarize(samples: Iterable[tuple[str, list[int]]]) -> Summary:
+    """Summarize (outcome, chain) pairs directly, without a file."""
+    outcome_counts: Counter[str] = Counter()
+    lengths: dict[str, Counter[int]] = {
+        "Fail": Counter(),
+        "Success": Counter(),
+    }
+    for outcome, chain in samples:
+        outcome_counts[outcome] += 1
+        lengths[outcome][len(chain)] += 1
+    return outcome_counts, lengths
+
+
+def merge(left: Summary, right: Summary) -> Summary:
+    """Fold the right partial summary into the left one."""
+    outcome_counts, lengths = left
+    outcome_counts.update(right[0])
+    for outcome, counts in right[1].items():
+        lengths.setdefault(outcome, Counter()).update(counts)
+    return left
+
+
+def tree_reduce(partials: list[Summary]) -> Summary:
+    """
+    Merge adjacent pairs of partial summaries until only one remains.
+
+    >>> partials = [
+    ...     (Counter({"Fail": 1}), {"Fail": Counter({2: 1}), "Success": Counter()}),
+    ...     (Counter({"Success": 2}), {"Fail": Counter(), "Success": Counter({1: 2})}),
+    ...     (Counter({"Fail": 1}), {"Fail": Counter({2: 1}), "Success": Counter()}),
+    ... ]
+    >>> tree_reduce(partials)
+    (Counter({'Fail': 2, 'Success': 2}), {'Fail': Counter({2: 2}), 'Success': Counter({1: 2})})
+    """
+    if not partials:
+        return summarize([])
+    while len(partials) > 1:
+        merged = [
+            merge(partials[i], partials[i + 1])
+            for i in range(0, len(partials) - 1, 2)
+        ]
+        if len(partials) % 2:
+            merged.append(partials[-1])
+        partials = merged
+    return partials[0]
+
+
+def process_files_parallel(paths: list[Path], jobs: int) -> Summary:
+    """Summarize ``jobs`` shards of the files in worker processes."""
+    shards = [paths[i::jobs] for i in range(min(jobs, len(paths)))]
+    with futures.ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        partials = list(executor.map(process_files, shards))
+    return tree_reduce(partials)
+
+
+class SummaryCache:
+    """
+    A persistent JSON index of per-file partial summaries.
+
+    Each entry is keyed by the resolved path, and is valid while the file's
+    size and ``st_mtime_ns`` (and, optionally, its SHA-256 digest) match.
+    Only new or changed files are read; entries for deleted files are evicted.
+    """
+
+    VERSION = 1
+
+    def __init__(self, index: Path, use_hash: bool = False) -> None:
+        self.index = index
+        self.use_hash = use_hash
+        self.entries: dict[str, dict[str, Any]] = {}
+        self.parsed: list[Path] = []
+        if index.exists():
+            document = json.loads(index.read_text())
+            if document.get("version") == self.VERSION:
+                self.entries = document["files"]
+
+    @staticmethod
+    def digest(path: Path) -> str:
+        with path.open("rb") as source:
+            return hashlib.file_digest(source, "sha256").hexdigest()
+
+    def identity(self, path: Path) -> dict[str, Any]:
+        stat = path.stat()
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "digest": self.digest(path) if self.use_hash else None,
+        }
+
+    def is_current(self, path: Path) -> bool:
+        entry = self.entries.get(str(path.resolve()))
+        if entry is None:
+            return False
+        stat = path.stat()
+        if (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            return False
+        return not self.use_hash or entry["digest"] == self.digest(path)
+
+    def process_files(self, paths: list[Path], jobs: int = 1) -> Summary:
+        self.parsed = [path for path in paths if not self.is_current(path)]
+        # Before parsing: a file that's still being written is parsed in
+        # part, and that part must not look current once the file is done.
+        identities = [self.identity(path) for path in self.parsed]
+        if jobs > 1 and len(self.parsed) > 1:
+            with futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                fresh = list(executor.map(process_files, [[p] for p in self.parsed]))
+        else:
+            fresh = [process_files([path]) for path in self.parsed]
+        for path, identity, (outcome_counts, lengths) in zip(self.parsed, identities, fresh):
+            self.entries[str(path.resolve())] = identity | {
+                "outcomes": dict(outcome_counts),
+                "lengths": {k: dict(v) for k, v in lengths.items()},
+            }
+
+        for name in [name for name in self.entries if not Path(name).exists()]:
+            del self.entries[name]
+        self.save()
+
+        partials: list[Summary] = []
+        for path in paths:
+            entry = self.entries[str(path.resolve())]
+            partials.append(
+                (
+                    Counter(entry["outcomes"]),
+                    {
+                        outcome: Counter({int(k): v for k, v in counts.items()})
+                        for outcome, counts in entry["lengths"].items()
+                    },
+                )
+            )
+        return tree_reduce(partials)
+
+    def save(self) -> None:
+        temporary = self.index.with_name(self.index.name + ".tmp")
+        temporary.write_text(
+            json.dumps({"version": self.VERSION, "files": self.entries})
+        )
+        os.replace(temporary, self.index)
+
+
 # In[5]:
 
 
@@ -81,11 +471,21 @@ def write_report(
 
 def main(argv: list[str] = sys.argv[1:]) -> None:
     paths = list(Path("data/ch14").glob("*.csv"))
+    paths += Path("data/ch14").glob(f"*{markov_gen.BINARY_SUFFIX}")
+    for suffix in markov_gen.COMPRESSION:
+        paths += Path("data/ch14").glob(f"*.csv{suffix}")
     parser = argparse.ArgumentParser()
     parser.add_argument("-o", "--output", type=Path, default=None)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-c", "--cache", type=Path, default=None)
+    parser.add_argument("--hash", action="store_true", default=False)
     parser.add_argument("data", nargs="*", type=Path, default=paths)
     options = parser.parse_args(argv)
-    outcome_counts, lengths = process_files(options.data)
+    if options.cache:
+        cache = SummaryCache(options.cache, use_hash=options.hash)
+        outcome_counts, lengths = cache.process_files(options.data, options.jobs)
+    else:
+        outcome_counts, lengths = process_files(options.data, options.jobs)
     if options.output:
         with options.output.open("w") as target_file:
             with contextlib.redirect_stdout(target_file):
@@ -96,3 +496,164 @@ def main(argv: list[str] = sys.argv[1:]) -> None:
 
 if __name__ == "__main__":
     main()
+
+
+test_parallel = """
+>>> import io, tempfile
+>>> with tempfile.TemporaryDirectory() as directory:
+...     paths = [Path(directory) / f"sample_{i}.csv" for i in range(5)]
+...     for i, path in enumerate(paths):
+...         with contextlib.redirect_stdout(io.StringIO()):
+...             markov_gen.main(["-s", "200", "-r", str(i + 1), "-o", str(path)])
+...     reports = []
+...     for jobs in 1, 3:
+...         with contextlib.redirect_stdout(io.StringIO()) as report:
+...             write_report(*process_files(paths, jobs))
+...         reports.append(report.getvalue())
+>>> reports[0] == reports[1]
+True
+"""
+
+test_cache = """
+>>> import io, tempfile
+>>> def report(summary: Summary) -> str:
+...     with contextlib.redirect_stdout(io.StringIO()) as text:
+...         write_report(*summary)
+...     return text.getvalue()
+
+>>> with tempfile.TemporaryDirectory() as directory:
+...     paths = [Path(directory) / f"sample_{i}.csv" for i in range(3)]
+...     for i, path in enumerate(paths):
+...         with contextlib.redirect_stdout(io.StringIO()):
+...             markov_gen.main(["-s", "100", "-r", str(i + 1), "-o", str(path)])
+...     index = Path(directory) / "index.json"
+...     first = SummaryCache(index).process_files(paths[:2])
+...     cache = SummaryCache(index)
+...     second = cache.process_files(paths)
+...     print([p.name for p in cache.parsed], len(cache.entries))
+...     cache = SummaryCache(index)
+...     third = cache.process_files(paths)
+...     print([p.name for p in cache.parsed])
+...     print(report(third) == report(process_files(paths)))
+...     paths[0].unlink()
+...     cache = SummaryCache(index)
+...     fourth = cache.process_files(paths[1:])
+...     print(len(cache.entries), report(fourth) == report(process_files(paths[1:])))
+['sample_2.csv'] 3
+[]
+True
+2 True
+
+A file that grows while it's parsed is parsed again on the next run.
+
+>>> from unittest import mock
+>>> with tempfile.TemporaryDirectory() as directory:
+...     path = Path(directory) / "growing.csv"
+...     with contextlib.redirect_stdout(io.StringIO()):
+...         markov_gen.main(["-s", "100", "-r", "1", "-o", str(path)])
+...     complete = path.read_text()
+...     _ = path.write_text(complete[: len(complete) // 2])
+...     def writer_finishes(paths: list[Path]) -> Summary:
+...         partial = process_files(paths)
+...         _ = path.write_text(complete)
+...         return partial
+...     index = Path(directory) / "index.json"
+...     with mock.patch(f"{__name__}.process_files", writer_finishes):
+...         _ = SummaryCache(index).process_files([path])
+...     cache = SummaryCache(index)
+...     final = cache.process_files([path])
+...     print([p.name for p in cache.parsed], report(final) == report(process_files([path])))
+['growing.csv'] True
+"""
+
+test_compressed = """
+>>> import argparse, gzip, io, tempfile
+>>> with tempfile.TemporaryDirectory() as directory:
+...     reports = []
+...     for name in "s.csv", "s.csv.gz", "s.csv.bz2", "s.csv.xz":
+...         path = Path(directory) / name
+...         options = argparse.Namespace(samples=500, randomize=1, output=path)
+...         if path.suffix in markov_gen.COMPRESSION:
+...             compression = markov_gen.COMPRESSION[path.suffix]
+...             target = markov_gen.CompressedWriter(path.open("wb"), compression, 1_000, 2)
+...         else:
+...             target = path.open("w")
+...         with target:
+...             markov_gen.write_samples(target, options)
+...         with contextlib.redirect_stdout(io.StringIO()) as report:
+...             write_report(*process_files([path]))
+...         reports.append(report.getvalue())
+...     data = (Path(directory) / "s.csv.gz").read_bytes()
+...     plain = (Path(directory) / "s.csv").read_bytes()
+...     members = stream_starts("gzip", data)
+...     decoded = gzip.decompress(data).splitlines()
+>>> len(members) > 5, decoded[1:-1] == plain.splitlines()[1:-1]
+(True, True)
+>>> all(report == reports[0] for report in reports)
+True
+
+An ordinary gzip file can have several members, without the subfield.
+
+>>> with tempfile.TemporaryDirectory() as directory:
+...     plain = Path(directory) / "s.csv"
+...     with contextlib.redirect_stdout(io.StringIO()):
+...         markov_gen.main(["-s", "500", "-r", "1", "-o", str(plain)])
+...     text = plain.read_bytes()
+...     split = text.index(b"Success", len(text) // 2) + 3
+...     members = Path(directory) / "s.csv.gz"
+...     _ = members.write_bytes(gzip.compress(text[:split]) + gzip.compress(text[split:]))
+...     print(stream_starts("gzip", members.read_bytes()))
+...     print(process_files([members]) == process_files([plain]))
+...     print(b"".join(decompressed_blocks(members)) == text)
+None
+True
+True
+"""
+
+test_scan_csv = """
+>>> import tempfile
+>>> def both(path: Path) -> tuple[bool, Summary, Summary]:
+...     fast: Summary = (Counter(), {"Fail": Counter(), "Success": Counter()})
+...     slow: Summary = (Counter(), {"Fail": Counter(), "Success": Counter()})
+...     scanned = scan_csv(path, *fast)
+...     process_csv(path, *slow)
+...     return scanned, fast, slow
+>>> results = [both(path) for path in sorted(Path("data/ch14").glob("*.csv"))]
+>>> len(results) > 0 and all(scanned and fast == slow for scanned, fast, slow in results)
+True
+
+>>> with tempfile.TemporaryDirectory() as directory:
+...     path = Path(directory) / "quoted.csv"
+...     _ = path.write_text(
+...         '# -----\\noutcome,length,chain\\nSuccess,1,7\\n"Fail",2,"4,7"\\n"Fail",3,"4;\\n5;7"\\n'
+...     )
+...     scanned, fast, slow = both(path)
+>>> scanned, fast == (Counter(), {"Fail": Counter(), "Success": Counter()})
+(False, True)
+>>> slow
+(Counter({'Fail': 2, 'Success': 1}), {'Fail': Counter({2: 1, 3: 1}), 'Success': Counter({1: 1})})
+"""
+
+test_trailer = """
+>>> import io, tempfile, zlib
+>>> def parsed(path: Path) -> Summary:
+...     summary: Summary = (Counter(), {"Fail": Counter(), "Success": Counter()})
+...     process_csv(path, *summary)
+...     return summary
+>>> with tempfile.TemporaryDirectory() as directory:
+...     path = Path(directory) / "sample.csv"
+...     with contextlib.redirect_stdout(io.StringIO()):
+...         markov_gen.main(["-s", "500", "-r", "1", "-o", str(path)])
+...     trailer = read_trailer(path)
+...     data = path.read_bytes()
+...     rows = data[data.index(b"outcome,") : data.index(b"# =====")]
+...     crc = json.loads(data.splitlines()[-2].partition(b" = ")[2])["crc32"]
+...     print(trailer == parsed(path) == process_files([path]), zlib.crc32(rows) == crc)
+...     with path.open("a") as target:
+...         _ = target.write("Success,1,7\\n")
+...     print(read_trailer(path), process_files([path])[0].total())
+True True
+None 500
+"""
+
+__test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
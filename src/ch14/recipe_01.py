@@ -44,7 +44,8 @@ import markov_gen
 import markov_summ
 
 
-def gen_and_summ(iterations: int, samples: int) -> None:
+def gen_and_summ(iterations: int, samples: int, cache: Path | None = None) -> None:
+    cache_args = ["--cache", str(cache)] if cache else []
     for i in range(iterations):
         markov_gen.main(
             [
@@ -52,6 +53,7 @@ def gen_and_summ(iterations: int, samples: int) -> None:
                 "--randomize", str(i + 1),
                 "--output", f"data/ch14/markov_{i}.csv",
             ]
+            + cache_args
         )
     markov_summ.main()
 
@@ -101,25 +103,402 @@ def generator_function(samples: int, i: int) -> str:
 
 
 
+def file_function(samples: int, i: int) -> str:
+    """
+    Like generator_function(), without redirecting sys.stdout,
+    so it's safe to run in several threads at once.
+    Each call has its own Dice and Writer.
+    """
+    options = markov_gen.get_options(
+        [
+            "--samples", str(samples),
+            "--randomize", str(i + 1),
+            "--output", f"data/ch14/markov_{i}.csv",
+        ]
+    )
+    with options.output.open("w") as target_file:
+        markov_gen.write_samples(target_file, options)
+    header = io.StringIO()
+    markov_gen.CSVWriter(header).header(options, columns=False)
+    return header.getvalue()
+
+
 from concurrent import futures
+from typing import Literal, TypeAlias
+
+Backend: TypeAlias = Literal["processes", "threads", "inline"]
+BACKENDS: tuple[Backend, ...] = ("processes", "threads", "inline")
+
+
+def gil_enabled() -> bool:
+    """False only on a free-threaded build with the GIL disabled."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_gil_enabled is None else bool(is_gil_enabled())
+
 
 def parallel_generators(
-    iterations: int = 10, samples: int = 1_000, workers: int | None = None
+    iterations: int = 10,
+    samples: int = 1_000,
+    workers: int | None = None,
+    backend: Backend = "processes",
 ) -> None:
     worker_list = []
     reports = []
     # Fan-out the generators
+    if backend == "inline":
+        reports = [file_function(samples, i) for i in range(iterations)]
+    else:
+        executor_class = (
+            futures.ProcessPoolExecutor
+            if backend == "processes"
+            else futures.ThreadPoolExecutor
+        )
+        task = generator_function if backend == "processes" else file_function
+        with executor_class(max_workers=workers) as executor:
+            for i in range(iterations):
+                worker_list.append(executor.submit(task, samples, i))
+            for worker in worker_list:
+                gen_report = worker.result()
+                reports.append(gen_report)
+
+    # Fan-in and reduce
+    for rpt in reports:
+        print(rpt)
+    markov_summ.main()
+
+
+# In-memory map-reduce: the workers return summaries instead of files.
+
+from collections.abc import Iterable, Iterator
+import markov_summ_2
+
+
+def persisted(
+    writer: markov_gen.Writer, chains: Iterable[tuple[str, markov_gen.Chain]]
+) -> Iterator[tuple[str, markov_gen.Chain]]:
+    for outcome, chain in chains:
+        writer.sample(outcome, chain)
+        yield outcome, chain
+    writer.close()
+
+
+def summary_function(
+    samples: int, i: int, persist: bool = False
+) -> tuple[str, markov_summ_2.Summary]:
+    options = markov_gen.get_options(
+        [
+            "--samples", str(samples),
+            "--randomize", str(i + 1),
+            "--output", f"data/ch14/markov_{i}.csv",
+        ]
+    )
+    header = io.StringIO()
+    markov_gen.CSVWriter(header).header(options, columns=False)
+    chains = markov_gen.sample_iter(options)
+    if not persist:
+        return header.getvalue(), markov_summ_2.summarize(chains)
+    with options.output.open("w") as target_file:
+        writer = markov_gen.CSVWriter(target_file)
+        writer.header(options, columns=True)
+        summary = markov_summ_2.summarize(persisted(writer, chains))
+    return header.getvalue(), summary
+
+
+def parallel_summaries(
+    iterations: int = 10,
+    samples: int = 1_000,
+    workers: int | None = None,
+    persist: bool = False,
+) -> None:
+    worker_list = []
+    reports = []
+    partials = []
+    # Fan-out the generators
     with futures.ProcessPoolExecutor(max_workers=workers) as executor:
         for i in range(iterations):
-            worker_list.append(executor.submit(generator_function, samples, i))
+            worker_list.append(
+                executor.submit(summary_function, samples, i, persist)
+            )
         for worker in worker_list:
-            gen_report = worker.result()
+            gen_report, summary = worker.result()
             reports.append(gen_report)
+            partials.append(summary)
 
     # Fan-in and reduce
     for rpt in reports:
         print(rpt)
-    markov_summ.main()
+    markov_summ_2.write_report(*markov_summ_2.tree_reduce(partials))
+
+
+# Split streams: the chunks of one root seed, independent of the workers.
+
+
+def chunk_function(seed: int, start: int, stop: int) -> markov_summ_2.Summary:
+    return markov_summ_2.summarize(markov_gen.split_chains(seed, start, stop))
+
+
+def split_summaries(
+    samples: int = 10_000,
+    seed: int = 1,
+    chunk: int = 1_000,
+    workers: int | None = None,
+) -> markov_summ_2.Summary:
+    """
+    Summarize ``samples`` chains from a root ``seed`` in chunks.
+    The result is the same for any chunk size and number of workers.
+    """
+    bounds = [
+        (start, min(start + chunk, samples)) for start in range(0, samples, chunk)
+    ]
+    with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        worker_list = [
+            executor.submit(chunk_function, seed, start, stop) for start, stop in bounds
+        ]
+        partials = [worker.result() for worker in worker_list]
+    return markov_summ_2.tree_reduce(partials)
+
+
+# Pipelined fan-in: the workers stream batches to a consumer process.
+
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.queues
+from collections import Counter
+from queue import Empty
+from typing import cast
+
+Batch: TypeAlias = list[tuple[str, int]] | None
+BatchQueue: TypeAlias = "multiprocessing.queues.Queue[Batch]"
+
+_batch_queue: BatchQueue
+
+
+def _set_batch_queue(queue: BatchQueue) -> None:
+    global _batch_queue
+    _batch_queue = queue
+
+
+def stream_function(samples: int, i: int, batch_size: int) -> str:
+    """
+    Put (outcome, length) batches on the queue, then a None sentinel.
+    The put blocks while the queue is full.
+    """
+    options = markov_gen.get_options(
+        [
+            "--samples", str(samples),
+            "--randomize", str(i + 1),
+            "--output", f"data/ch14/markov_{i}.csv",
+        ]
+    )
+    header = io.StringIO()
+    markov_gen.CSVWriter(header).header(options, columns=False)
+    try:
+        batch: list[tuple[str, int]] = []
+        for outcome, chain in markov_gen.sample_iter(options):
+            batch.append((outcome, len(chain)))
+            if len(batch) == batch_size:
+                _batch_queue.put(batch)
+                batch = []
+        if batch:
+            _batch_queue.put(batch)
+    finally:
+        _batch_queue.put(None)
+    return header.getvalue()
+
+
+def fold_batches(
+    queue: BatchQueue, producers: int, result: multiprocessing.connection.Connection
+) -> None:
+    """Fold batches into a summary until every producer has finished."""
+    outcome_counts, lengths = summary = markov_summ_2.summarize([])
+    finished = 0
+    while finished < producers:
+        batch = queue.get()
+        if batch is None:
+            finished += 1
+            continue
+        for (outcome, length), count in Counter(batch).items():
+            outcome_counts[outcome] += count
+            lengths[outcome][length] += count
+    result.send(summary)
+
+
+def await_summary(
+    receiver: multiprocessing.connection.Connection,
+    consumer: multiprocessing.Process,
+    worker_list: list[futures.Future[str]],
+    poll: float = 0.1,
+) -> markov_summ_2.Summary:
+    """
+    The consumer's summary. Raises the first producer's exception,
+    or RuntimeError if the consumer exits without sending a summary.
+    """
+    while True:
+        ready = multiprocessing.connection.wait([receiver, consumer.sentinel], poll)
+        if receiver in ready:
+            try:
+                return cast(markov_summ_2.Summary, receiver.recv())
+            except EOFError:
+                pass
+        if receiver in ready or consumer.sentinel in ready:
+            # The pipe closes as the consumer exits; wait for its exit code.
+            consumer.join(timeout=5)
+            raise RuntimeError(
+                f"consumer exited with code {consumer.exitcode}, without a summary"
+            )
+        for worker in worker_list:
+            if worker.done() and worker.exception():
+                worker.result()
+
+
+def drain(queue: BatchQueue, worker_list: list[futures.Future[str]]) -> None:
+    """Discard batches until no producer is running, so none stays blocked."""
+    while not all(worker.done() for worker in worker_list):
+        try:
+            queue.get(timeout=0.1)
+        except Empty:
+            pass
+    while True:
+        try:
+            queue.get_nowait()
+        except Empty:
+            break
+
+
+def pipelined_summaries(
+    iterations: int = 10,
+    samples: int = 1_000,
+    workers: int | None = None,
+    batch_size: int = 1_000,
+    depth: int = 16,
+) -> None:
+    queue: BatchQueue = multiprocessing.Queue(maxsize=depth)
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    consumer = multiprocessing.Process(
+        target=fold_batches, args=(queue, iterations, sender)
+    )
+    consumer.start()
+    sender.close()
+    executor = futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_set_batch_queue, initargs=(queue,)
+    )
+    worker_list: list[futures.Future[str]] = []
+    try:
+        worker_list = [
+            executor.submit(stream_function, samples, i, batch_size)
+            for i in range(iterations)
+        ]
+        summary = await_summary(receiver, consumer, worker_list)
+        reports = [worker.result() for worker in worker_list]
+    except BaseException:
+        # A worker that died can't send its sentinel; a consumer that died
+        # leaves the producers blocked on the full queue.
+        consumer.terminate()
+        for worker in worker_list:
+            worker.cancel()
+        drain(queue, worker_list)
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        consumer.join()
+
+    for rpt in reports:
+        print(rpt)
+    markov_summ_2.write_report(*summary)
+
+
+# Shared-memory histogram: the workers count into one shared array.
+
+from multiprocessing import shared_memory
+
+HISTOGRAM_OUTCOMES = ("Fail", "Success")
+
+
+def generator_options(samples: int, i: int) -> argparse.Namespace:
+    return markov_gen.get_options(
+        [
+            "--samples", str(samples),
+            "--randomize", str(i + 1),
+            "--output", f"data/ch14/markov_{i}.csv",
+        ]
+    )
+
+
+def histogram_function(
+    name: str, slab: int, samples: int, i: int, max_length: int
+) -> None:
+    """
+    Count chains into this task's own slab of the shared array,
+    laid out as [outcome][length]. Lengths above ``max_length`` are
+    counted in an overflow cell at ``max_length + 1``.
+    Each task has its own slab, so there's no need for a lock.
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        # The view is released first, even on an error; close() needs that.
+        with cast(memoryview, memory.buf).cast("q") as cells:
+            width = max_length + 2
+            base = {
+                outcome: (slab * len(HISTOGRAM_OUTCOMES) + o) * width
+                for o, outcome in enumerate(HISTOGRAM_OUTCOMES)
+            }
+            overflow = max_length + 1
+            for outcome, chain in markov_gen.sample_iter(generator_options(samples, i)):
+                cells[base[outcome] + min(len(chain), overflow)] += 1
+    finally:
+        memory.close()
+
+
+def shared_histogram(
+    iterations: int = 10,
+    samples: int = 1_000,
+    workers: int | None = None,
+    max_length: int = 256,
+) -> markov_summ_2.Summary:
+    """
+    Summarize without moving any samples between processes.
+    Any chains longer than ``max_length`` are reported as ``max_length + 1``.
+    """
+    width = max_length + 2
+    cell_count = iterations * len(HISTOGRAM_OUTCOMES) * width
+    memory = shared_memory.SharedMemory(create=True, size=8 * cell_count)
+    try:
+        cast(memoryview, memory.buf)[: 8 * cell_count] = bytes(8 * cell_count)
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            worker_list = [
+                executor.submit(
+                    histogram_function, memory.name, i, samples, i, max_length
+                )
+                for i in range(iterations)
+            ]
+            for worker in worker_list:
+                worker.result()
+
+        outcome_counts, lengths = summary = markov_summ_2.summarize([])
+        with cast(memoryview, memory.buf).cast("q") as cells:
+            for slab in range(iterations):
+                for o, outcome in enumerate(HISTOGRAM_OUTCOMES):
+                    base = (slab * len(HISTOGRAM_OUTCOMES) + o) * width
+                    for length in range(1, width):
+                        if count := cells[base + length]:
+                            outcome_counts[outcome] += count
+                            lengths[outcome][length] += count
+    finally:
+        memory.close()
+        memory.unlink()
+    return summary
+
+
+def shared_histogram_summaries(
+    iterations: int = 10, samples: int = 1_000, workers: int | None = None
+) -> None:
+    summary = shared_histogram(iterations, samples, workers)
+    for i in range(iterations):
+        markov_gen.CSVWriter(sys.stdout).header(
+            generator_options(samples, i), columns=False
+        )
+        print()
+    markov_summ_2.write_report(*summary)
 
 
 test_parallel_serial = """
@@ -163,6 +542,100 @@ test_parallel_serial = """
 +==========+==========+
 ...
 
+# Threads
+>>> parallel_generators(10, 1000, workers=4, backend="threads")
+# file = "data/ch14/markov_0.csv"
+# samples = 1000
+# randomize = 1
+...
+{'Fail': 5109, 'Success': 4891}
+...
+
+"""
+
+test_parallel_summaries = """
+>>> parallel_summaries(10, 1000)
+# file = "data/ch14/markov_0.csv"
+# samples = 1000
+# randomize = 1
+...
+## Overview
++==========+==========+
+| Outcome  |  Count   |
++----------+----------+
+| Fail     |     5109 |
++----------+----------+
+| Success  |     4891 |
++==========+==========+
+...
+"""
+
+test_split_summaries = """
+>>> one = split_summaries(10_000, seed=42, chunk=10_000, workers=1)
+>>> many = split_summaries(10_000, seed=42, chunk=777, workers=3)
+>>> one == many
+True
+>>> one[0]
+Counter({'Fail': 5064, 'Success': 4936})
+"""
+
+test_pipelined_summaries = """
+>>> pipelined_summaries(10, 1000, batch_size=100, depth=4)
+# file = "data/ch14/markov_0.csv"
+# samples = 1000
+# randomize = 1
+...
+## Overview
++==========+==========+
+| Outcome  |  Count   |
++----------+----------+
+| Fail     |     5109 |
++----------+----------+
+| Success  |     4891 |
++==========+==========+
+...
+
+A consumer that dies is reported, rather than leaving the producers
+blocked on the full queue. (The forked consumer sees the patch.)
+
+>>> from unittest import mock
+>>> with mock.patch("markov_summ_2.summarize", side_effect=RuntimeError("crash")):
+...     pipelined_summaries(4, 10_000, batch_size=10, depth=2)
+Traceback (most recent call last):
+...
+RuntimeError: consumer exited with code 1, without a summary
+"""
+
+test_shared_histogram = """
+>>> shared_histogram_summaries(10, 1000)
+# file = "data/ch14/markov_0.csv"
+# samples = 1000
+# randomize = 1
+...
+## Overview
++==========+==========+
+| Outcome  |  Count   |
++----------+----------+
+| Fail     |     5109 |
++----------+----------+
+| Success  |     4891 |
++==========+==========+
+...
+>>> outcomes, lengths = shared_histogram(2, 1000, max_length=8)
+>>> max(lengths["Fail"]), max(lengths["Success"])
+(9, 9)
+
+An error in a task isn't hidden by a BufferError from ``close()``.
+
+>>> from unittest import mock
+>>> memory = shared_memory.SharedMemory(create=True, size=8 * 2 * 10)
+>>> with mock.patch("markov_gen.sample_iter", side_effect=RuntimeError("no samples")):
+...     histogram_function(memory.name, 0, 10, 0, 8)
+Traceback (most recent call last):
+...
+RuntimeError: no samples
+>>> memory.close()
+>>> memory.unlink()
 """
 
 
@@ -3,14 +3,26 @@
 # Chapter: Application Integration: Combination
 # Recipe: Combining two applications into one
 
+import argparse
 from collections.abc import Callable, Iterator
+from concurrent import futures
 import contextlib
+from dataclasses import asdict, dataclass, field
+import datetime
 import io
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
 from pathlib import Path
+import platform
+import sys
+import tempfile
 import time
 from typing import Any, Literal
 
-from recipe_01 import gen_and_summ, parallel_generators
+from recipe_01 import BACKENDS, gen_and_summ, gil_enabled, parallel_generators
 
 
 def cleanup() -> Iterator[Literal[None]]:
@@ -22,43 +34,297 @@ def cleanup() -> Iterator[Literal[None]]:
     data.rmdir()
 
 
-def benchmark(f: Callable[..., Any], args: Any, **kwargs: Any) -> list[float]:
-    timing: list[float] = []
-    for sample in range(4):
-        fixture_iter = iter(cleanup())
-        next(fixture_iter)
-        start = time.perf_counter()
-        with contextlib.redirect_stdout(io.StringIO()) as output:
-            f(*args, **kwargs)
-        end = time.perf_counter()
-        try:
+from statistics import NormalDist, mean, stdev
+
+
+@dataclass
+class Result:
+    """
+    Timings for one benchmark, in seconds, and the peak RSS in KiB
+    of the fresh process that ran it, and that process's children.
+    """
+
+    name: str
+    wall: list[float] = field(default_factory=list)
+    cpu: list[float] = field(default_factory=list)
+    peak_rss_kib: int | None = None
+
+    @property
+    def mean(self) -> float:
+        return mean(self.wall)
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        """Half the width of the confidence interval for the mean wall time."""
+        if len(self.wall) < 2:
+            return float("inf")
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        return z * stdev(self.wall) / math.sqrt(len(self.wall))
+
+
+def peak_rss_kib() -> int | None:
+    """
+    High-water mark of this process and its (waited-for) children,
+    or None where there's no ``resource`` module (Windows).
+    It never goes down: it's only a per-benchmark value in a fresh process.
+
+    >>> from unittest import mock
+    >>> peak_rss_kib() > 0
+    True
+    >>> with mock.patch.dict(sys.modules, {"resource": None}):
+    ...     print(peak_rss_kib())
+    None
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # macOS reports bytes, Linux reports KiB.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def benchmark(
+    name: str,
+    f: Callable[..., Any],
+    args: Any,
+    *,
+    fixture: Callable[[], Iterator[None]] | None = None,
+    warmup: int = 1,
+    min_runs: int = 5,
+    max_runs: int = 50,
+    precision: float = 0.05,
+    confidence: float = 0.95,
+    **kwargs: Any,
+) -> Result:
+    """
+    Run ``f(*args, **kwargs)`` until the confidence interval for the mean
+    wall time is within ``precision`` of the mean, or ``max_runs`` is reached.
+    The warm-up runs are not recorded.
+    """
+    result = Result(name)
+    for run in range(warmup + max_runs):
+        fixture_iter = iter(fixture()) if fixture else None
+        if fixture_iter:
             next(fixture_iter)
-        except StopIteration:
-            pass
-        timing.append(end - start)
-    return timing
+        cpu_start, wall_start = cpu_seconds(), time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            f(*args, **kwargs)
+        wall_end, cpu_end = time.perf_counter(), cpu_seconds()
+        if fixture_iter:
+            next(fixture_iter, None)
+        if run < warmup:
+            continue
+        result.wall.append(wall_end - wall_start)
+        result.cpu.append(cpu_end - cpu_start)
+        if (
+            len(result.wall) >= min_runs
+            and result.half_width(confidence) <= precision * result.mean
+        ):
+            break
+    result.peak_rss_kib = peak_rss_kib()
+    return result
 
 
-from statistics import mean
-import multiprocessing
+def isolated(name: str, f: Callable[..., Any], args: Any, **kwargs: Any) -> Result:
+    """
+    ``benchmark()`` in a new interpreter, so the peak RSS is this benchmark's
+    alone, not the high-water mark of everything run before it.
+    """
+    context = multiprocessing.get_context("spawn")
+    with futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(benchmark, name, f, args, **kwargs).result()
+
+
+# The cases: the chain engine, the writers, the summarizer, and the fan-out.
+
+import markov_gen
+import markov_summ_2
+
+
+def engine_case(samples: int, engine: str) -> None:
+    options = argparse.Namespace(
+        samples=samples, randomize=1, output=None, engine=engine
+    )
+    for _ in markov_gen.sample_iter(options):
+        pass
+
+
+def writer_case(samples: int, suffix: str, directory: Path) -> None:
+    output = directory / f"bench{suffix}"
+    options = argparse.Namespace(samples=samples, randomize=1, output=output)
+    with output.open("wb" if markov_gen.is_binary(options) else "w") as target:
+        markov_gen.write_samples(target, options)
+
+
+def summary_case(paths: list[Path], jobs: int) -> None:
+    markov_summ_2.process_files(paths, jobs)
+
+
+def suite(scale: int, directory: Path) -> Iterator[Result]:
+    samples = 1_000 * scale
+    yield isolated("engine_table", engine_case, (samples, "table"))
+    if importlib.util.find_spec("numpy"):
+        yield isolated("engine_numpy", engine_case, (samples, "numpy"))
+    for suffix in ".csv", markov_gen.BINARY_SUFFIX:
+        yield isolated(f"writer{suffix}", writer_case, (samples, suffix, directory))
+
+    inputs: dict[str, list[Path]] = {".csv": [], markov_gen.BINARY_SUFFIX: []}
+    for i in range(8):
+        for suffix, paths in inputs.items():
+            path = directory / f"summ_{i}{suffix}"
+            options = argparse.Namespace(samples=samples, randomize=i + 1, output=path)
+            with path.open("wb" if markov_gen.is_binary(options) else "w") as target:
+                markov_gen.write_samples(target, options)
+            paths.append(path)
+    for suffix, paths in inputs.items():
+        yield isolated(f"summarize{suffix}", summary_case, (paths, 1))
+    yield isolated("summarize_jobs_4", summary_case, (inputs[".csv"], 4))
+
+    fanout = (10 * scale, 1_000)
+    yield isolated("fanout_serial", gen_and_summ, fanout, fixture=cleanup)
+    yield isolated("fanout_parallel", parallel_generators, fanout, fixture=cleanup)
+
+    for size in 10, 1_000, 10 * samples:
+        for backend in BACKENDS:
+            yield isolated(
+                f"backend_{backend}_{size}",
+                parallel_generators,
+                (10, size),
+                backend=backend,
+                fixture=cleanup,
+            )
+
+
+def backend_winners(results: list[Result]) -> dict[str, str]:
+    """
+    The fastest parallel_generators() backend at each number of samples.
+
+    >>> backend_winners([
+    ...     Result("backend_processes_10", [0.5]), Result("backend_inline_10", [0.1]),
+    ...     Result("backend_processes_1000", [0.5]), Result("backend_inline_1000", [0.9]),
+    ... ])
+    {'10': 'inline', '1000': 'processes'}
+    """
+    best: dict[str, Result] = {}
+    for result in results:
+        if result.name.startswith("backend_"):
+            samples = result.name.rpartition("_")[2]
+            if samples not in best or result.mean < best[samples].mean:
+                best[samples] = result
+    return {samples: result.name.split("_")[1] for samples, result in best.items()}
+
+
+def machine() -> dict[str, Any]:
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "gil_enabled": gil_enabled(),
+    }
+
+
+def run(options: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        results = []
+        for result in suite(options.scale, Path(directory)):
+            rss = "" if result.peak_rss_kib is None else f"{result.peak_rss_kib:8d} KiB"
+            print(
+                f"{result.name:22s} {result.mean:8.4f}s "
+                f"± {result.half_width():7.4f} "
+                f"({len(result.wall)} runs) {rss}"
+            )
+            results.append(result)
+    winners = backend_winners(results)
+    document = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine": machine(),
+        "scale": options.scale,
+        "results": [asdict(result) for result in results],
+        "backend_winners": winners,
+    }
+    for samples, backend in winners.items():
+        print(f"Fastest backend for {samples} samples: {backend}")
+    options.output.write_text(json.dumps(document, indent=2))
+    print(f"Wrote {options.output}")
+
+
+def regressions(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float = 0.10
+) -> list[str]:
+    """
+    The benchmarks that are slower by more than ``threshold``,
+    where the confidence intervals don't overlap.
+
+    >>> base = {"results": [{"name": "a", "wall": [1.0, 1.1, 0.9], "cpu": [], "peak_rss_kib": 0}]}
+    >>> slow = {"results": [{"name": "a", "wall": [1.5, 1.6, 1.4], "cpu": [], "peak_rss_kib": 0}]}
+    >>> regressions(base, slow)
+    ['a']
+    >>> regressions(base, base)
+    []
+    """
+    before = {r["name"]: Result(**r) for r in baseline["results"]}
+    problems = []
+    for r in current["results"]:
+        now = Result(**r)
+        if now.name not in before:
+            continue
+        then = before[now.name]
+        slower = now.mean > then.mean * (1 + threshold)
+        separated = now.mean - now.half_width() > then.mean + then.half_width()
+        if slower and separated:
+            problems.append(now.name)
+    return problems
+
 
+def compare(options: argparse.Namespace) -> None:
+    baseline = json.loads(options.baseline.read_text())
+    current = json.loads(options.current.read_text())
+    before = {r["name"]: Result(**r) for r in baseline["results"]}
+    for r in current["results"]:
+        now = Result(**r)
+        if now.name in before:
+            change = now.mean / before[now.name].mean - 1
+            print(f"{now.name:22s} {before[now.name].mean:8.4f}s {now.mean:8.4f}s {change:+7.1%}")
+    problems = regressions(baseline, current, options.threshold)
+    for name in problems:
+        print(f"REGRESSION: {name}")
+    if problems:
+        sys.exit(1)
 
-def stats(label: str, series: list[float]) -> None:
-    m = mean(series)
-    a = max(series)
-    i = min(series)
-    print(f"{label:22s} {i:7.3f} {m:6.2f} {a:7.3f} ")
 
+def get_options(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Markov pipeline benchmarks")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("-o", "--output", type=Path, default=Path("benchmark.json"))
+    run_parser.add_argument("-s", "--scale", type=int, default=10)
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("-t", "--threshold", type=float, default=0.10)
+    options = parser.parse_args(argv)
+    if options.command is None:
+        options = parser.parse_args(["run", *argv])
+    return options
 
-def main() -> None:
-    serial = benchmark(gen_and_summ, (500, 1000))
-    parallel = benchmark(parallel_generators, (500, 1000))
-    parallel_16 = benchmark(parallel_generators, (500, 1000), workers=16)
 
-    workers = multiprocessing.cpu_count()
-    stats("Serial", serial)
-    stats(f"Parallel ({workers} workers)", parallel)
-    stats("Parallel (16 workers)", parallel_16)
+def main(argv: list[str] = sys.argv[1:]) -> None:
+    options = get_options(argv)
+    if options.command == "compare":
+        compare(options)
+    else:
+        run(options)
 
 
 if __name__ == "__main__":
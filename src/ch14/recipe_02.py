@@ -9,6 +9,7 @@
 
 
 import argparse
+from pathlib import Path
 
 class Command:
     def __init__(self) -> None:
@@ -17,6 +18,12 @@ class Command:
     def execute(self, options: argparse.Namespace) -> None:
         pass
 
+    def inputs(self, options: argparse.Namespace) -> list[Path]:
+        return []
+
+    def outputs(self, options: argparse.Namespace) -> list[Path]:
+        return []
+
 
 from pathlib import Path
 from typing import Any
@@ -34,6 +41,9 @@ class Generate(Command):
             markov_gen.write_samples(target, options)
         print(f"Created {str(self.output)}")
 
+    def outputs(self, options: argparse.Namespace) -> list[Path]:
+        return [Path(options.output)]
+
 
 
 import contextlib
@@ -48,6 +58,12 @@ class Summarize(Command):
             with contextlib.redirect_stdout(result_file):
                 markov_summ_2.write_report(outcomes, lengths)
 
+    def inputs(self, options: argparse.Namespace) -> list[Path]:
+        return [Path(f) for f in options.output_files]
+
+    def outputs(self, options: argparse.Namespace) -> list[Path]:
+        return [Path(options.summary_file)]
+
 
 def main() -> None:
     options_1 = argparse.Namespace(samples=1000, output="data/x.csv")
@@ -127,6 +143,207 @@ Created data/...
 ...
 """
 
+# Subsection: There's more...
+# Topic: Scheduling a graph of commands
+
+import hashlib
+import io
+import json
+from concurrent import futures
+from typing import NamedTuple, Protocol
+
+
+class Schedulable(Protocol):
+    def execute(self, options: argparse.Namespace) -> None: ...
+
+    def inputs(self, options: argparse.Namespace) -> list[Path]: ...
+
+    def outputs(self, options: argparse.Namespace) -> list[Path]: ...
+
+
+class Step(NamedTuple):
+    command: Schedulable
+    options: argparse.Namespace
+
+    def digest(self) -> str:
+        text = repr((type(self.command).__qualname__, sorted(vars(self.options).items())))
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def key(self) -> str:
+        outputs = self.command.outputs(self.options)
+        return ";".join(str(p) for p in outputs) or repr(self)
+
+
+def run_step(step: Step) -> str:
+    with contextlib.redirect_stdout(io.StringIO()) as buffer:
+        step.command.execute(step.options)
+    return buffer.getvalue()
+
+
+class Scheduler(Command):
+    """
+    Runs steps as soon as the steps producing their inputs are done,
+    with independent steps running concurrently in worker processes.
+
+    A step is skipped when all of its outputs exist, are newer than all of
+    its inputs, and its options digest matches the one saved in ``state``.
+    """
+
+    def __init__(
+        self,
+        *steps: Step,
+        workers: int | None = None,
+        state: Path = Path("data") / "ch14_r02_schedule.json",
+    ) -> None:
+        super().__init__()
+        self.steps = list(steps)
+        self.workers = workers
+        self.state = state
+        self.ran: list[Step] = []
+        self.skipped: list[Step] = []
+
+    def dependencies(self) -> dict[int, set[int]]:
+        producers = {
+            path: index
+            for index, step in enumerate(self.steps)
+            for path in step.command.outputs(step.options)
+        }
+        return {
+            index: {
+                producers[path]
+                for path in step.command.inputs(step.options)
+                if path in producers
+            }
+            for index, step in enumerate(self.steps)
+        }
+
+    def is_current(self, step: Step, digests: dict[str, str]) -> bool:
+        outputs = step.command.outputs(step.options)
+        if not outputs or not all(path.exists() for path in outputs):
+            return False
+        if digests.get(step.key()) != step.digest():
+            return False
+        oldest = min(path.stat().st_mtime_ns for path in outputs)
+        return all(
+            path.stat().st_mtime_ns <= oldest
+            for path in step.command.inputs(step.options)
+        )
+
+    def execute(self, options: argparse.Namespace) -> None:
+        """Runs the steps; each step carries its own options."""
+        digests: dict[str, str] = (
+            json.loads(self.state.read_text()) if self.state.exists() else {}
+        )
+        waiting = self.dependencies()
+        self.ran, self.skipped = [], []
+        running: dict[futures.Future[str], int] = {}
+        with futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while waiting or running:
+                ready = [index for index, needs in waiting.items() if not needs]
+                if not ready and not running:
+                    raise ValueError(f"dependency cycle among steps {sorted(waiting)}")
+                for index in ready:
+                    del waiting[index]
+                    step = self.steps[index]
+                    if self.is_current(step, digests):
+                        self.skipped.append(step)
+                        self.finished(index, waiting)
+                    else:
+                        running[executor.submit(run_step, step)] = index
+                if not running:
+                    continue
+                done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    print(future.result(), end="")
+                    step = self.steps[index]
+                    self.ran.append(step)
+                    digests[step.key()] = step.digest()
+                    self.finished(index, waiting)
+        self.state.write_text(json.dumps(digests, indent=2))
+
+    @staticmethod
+    def finished(index: int, waiting: dict[int, set[int]]) -> None:
+        for needs in waiting.values():
+            needs.discard(index)
+
+
+class ParallelGenSumm(Scheduler):
+    """Several concurrent Generate steps, and one Summarize step."""
+
+    def execute(self, options: argparse.Namespace) -> None:
+        outputs = [
+            Path("data") / f"ch14_r02_{i}.csv" for i in range(options.iterations)
+        ]
+        self.steps = [
+            Step(
+                Generate(),
+                argparse.Namespace(
+                    samples=options.samples,
+                    randomize=options.randomize + i,
+                    output=str(output),
+                ),
+            )
+            for i, output in enumerate(outputs)
+        ]
+        self.steps.append(
+            Step(
+                Summarize(),
+                argparse.Namespace(
+                    summary_file=options.summary_file,
+                    output_files=[str(output) for output in outputs],
+                ),
+            )
+        )
+        super().execute(options)
+
+
+test_scheduler = """
+>>> from argparse import Namespace
+>>> Path("data/ch14_r02_schedule.json").unlink(missing_ok=True)
+>>> options = Namespace(
+...     samples=1_000,
+...     randomize=42,
+...     iterations=4,
+...     summary_file="data/y3.md",
+... )
+>>> sweep = ParallelGenSumm(workers=2)
+>>> sweep.execute(options)  # doctest: +ELLIPSIS
+Created data/ch14_r02_...
+Created data/ch14_r02_...
+Created data/ch14_r02_...
+Created data/ch14_r02_...
+>>> len(sweep.ran), len(sweep.skipped)
+(5, 0)
+>>> print(Path("data/y3.md").read_text())
+## Overview
++==========+==========+
+| Outcome  |  Count   |
++----------+----------+
+| Fail     |     2040 |
++----------+----------+
+| Success  |     1960 |
++==========+==========+
+...
+
+>>> sweep.execute(options)
+>>> len(sweep.ran), len(sweep.skipped)
+(0, 5)
+
+# Change one Generate step: it reruns, and so does the Summarize step.
+>>> sweep.steps[1].options.samples = 500
+>>> rerun = Scheduler(*sweep.steps, workers=2)
+>>> rerun.execute(options)
+Created data/ch14_r02_1.csv
+>>> [type(step.command).__name__ for step in rerun.ran], len(rerun.skipped)
+(['Generate', 'Summarize'], 3)
+
+>>> for path in Path("data").glob("ch14_r02_[0-9].csv"):
+...     path.unlink()
+>>> Path("data/ch14_r02_schedule.json").unlink()
+>>> Path("data/y3.md").unlink()
+"""
+
 # End of Combining many applications using the \textbf{Command
 
 __test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
@@ -14,6 +14,7 @@ markov gensumm -g samples
 """
 
 import argparse
+from pathlib import Path
 import sys
 from typing import Any
 
@@ -32,6 +33,12 @@ class Command:
     def execute(self, options: argparse.Namespace) -> None:
         pass
 
+    def inputs(self, options: argparse.Namespace) -> list[Path]:
+        return []
+
+    def outputs(self, options: argparse.Namespace) -> list[Path]:
+        return []
+
 
 import os
 import markov_gen
@@ -63,6 +70,9 @@ class Generate(Command):
             markov_gen.write_samples(target, options)
         print(f"Created {str(self.output)}")
 
+    def outputs(self, options: argparse.Namespace) -> list[Path]:
+        return [Path(options.output)]
+
 
 import contextlib
 from pathlib import Path
@@ -92,6 +102,12 @@ class Summarize(Command):
         else:
             markov_summ_2.write_report(outcomes, lengths)
 
+    def inputs(self, options: argparse.Namespace) -> list[Path]:
+        return [Path(f) for f in options.output_files]
+
+    def outputs(self, options: argparse.Namespace) -> list[Path]:
+        return [Path(options.summary_file)] if options.summary_file else []
+
 
 class GenSumm(Command):
     @classmethod
@@ -247,6 +263,31 @@ test_options_3 = """
 Namespace(summary_file='file.csv', output_files=[], command=<class 'recipe_03.Summarize'>)
 """
 
+test_scheduler = """
+>>> from recipe_02 import Scheduler, Step
+>>> state = Path("data/ch14_r03_schedule.json")
+>>> state.unlink(missing_ok=True)
+>>> steps = [
+...     Step(Generate(), get_options(["generate", "-o", "data/ch14_r03_0.csv", "-r", "1"])),
+...     Step(Generate(), get_options(["generate", "-o", "data/ch14_r03_1.csv", "-r", "2"])),
+...     Step(Summarize(), get_options([
+...         "summarize", "-o", "data/ch14_r03_summary.md",
+...         "data/ch14_r03_0.csv", "data/ch14_r03_1.csv",
+...     ])),
+... ]
+>>> first = Scheduler(*steps, state=state)
+>>> first.execute(argparse.Namespace())
+Created data/ch14_r03_...
+Created data/ch14_r03_...
+>>> second = Scheduler(*steps, state=state)
+>>> second.execute(argparse.Namespace())
+>>> len(first.ran), len(second.ran), len(second.skipped)
+(3, 0, 3)
+
+>>> for name in "0.csv", "1.csv", "summary.md", "schedule.json":
+...     Path(f"data/ch14_r03_{name}").unlink()
+"""
+
 # End of Managing arguments and configuration in composite applications
 
 __test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
@@ -38,7 +38,14 @@ def spike_1() -> None:
     subprocess.run(command, check=True)
 
 
-def make_files(directory: Path, files: int = 100) -> None:
+MARKOV_GEN = [sys.executable, str(Path(__file__).parent / "markov_gen.py")]
+
+
+def make_files(directory: Path, files: int = 100, cache: Path | None = None) -> None:
+    """
+    With a ``cache``, each file has its own seed, so the runs can be cached.
+    This needs the Python ``markov_gen.py``; the compiled one has no cache.
+    """
     for n in range(files):
         filename = directory / f"sample_{n}.csv"
         command = [
@@ -46,6 +53,11 @@ def make_files(directory: Path, files: int = 100) -> None:
             "--samples", "10",
             "--output", str(filename),
         ]
+        if cache:
+            command = MARKOV_GEN + command[1:] + [
+                "--randomize", str(n + 1),
+                "--cache", str(cache),
+            ]
         subprocess.run(command, check=True)
 
 
@@ -77,6 +89,89 @@ def make_files_clean(directory: Path, files: int = 100) -> None:
         raise
 
 
+# Subsection: There's more...
+# Topic: Concurrent processes with asyncio
+
+import asyncio
+import os
+
+
+async def run_command(
+    command: list[str], semaphore: asyncio.Semaphore, timeout: float | None = None
+) -> str:
+    """Run one command, with at most ``semaphore`` processes at a time."""
+    async with semaphore:
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(command, timeout or 0)
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command, stdout)
+        return stdout.decode()
+
+
+async def run_commands(
+    commands: list[list[str]], limit: int | None = None, timeout: float | None = None
+) -> list[str]:
+    """
+    Run the commands concurrently, returning their output in command order.
+    The first failure cancels (and kills) all of the outstanding commands.
+    """
+    semaphore = asyncio.Semaphore(limit or os.cpu_count() or 1)
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [
+                group.create_task(run_command(command, semaphore, timeout))
+                for command in commands
+            ]
+    except ExceptionGroup as failures:
+        raise failures.exceptions[0]
+    return [task.result() for task in tasks]
+
+
+def make_files_async(
+    directory: Path,
+    files: int = 100,
+    limit: int | None = None,
+    timeout: float | None = None,
+    program: list[str] | None = None,
+) -> None:
+    commands = [
+        (program or ["markov_gen"]) + [
+            "--samples", "10",
+            "--output", str(directory / f"sample_{n}.csv"),
+        ]
+        for n in range(files)
+    ]
+    asyncio.run(run_commands(commands, limit, timeout))
+
+
+def make_files_async_clean(
+    directory: Path,
+    files: int = 100,
+    limit: int | None = None,
+    timeout: float | None = None,
+    program: list[str] | None = None,
+) -> None:
+    """Create sample data files concurrently, with cleanup after a failure."""
+    try:
+        make_files_async(directory, files, limit, timeout, program)
+    except subprocess.SubprocessError as ex:
+        # Remove any files.
+        for partial in directory.glob("sample_*.csv"):
+            partial.unlink()
+        raise
+
+
 # Subsection: There's more...
 # Topic: Unit test
 
@@ -163,6 +258,54 @@ def test_make_files_clean_good(
     assert len(list(directory.glob("sample_*.csv"))) == 3
 
 
+def test_make_files_cache(tmp_path: Path) -> None:
+    cache = tmp_path / "cache"
+    make_files(tmp_path, files=3, cache=cache)
+    first = {path.name: path.read_bytes() for path in tmp_path.glob("sample_*.csv")}
+    entries = sorted(cache.glob("??/*"))
+    assert len(first) == 3 and len(entries) == 3
+    for path in entries:
+        os.utime(path, ns=(0, 0))
+    for path in tmp_path.glob("sample_*.csv"):
+        path.unlink()
+
+    make_files(tmp_path, files=3, cache=cache)
+    second = {path.name: path.read_bytes() for path in tmp_path.glob("sample_*.csv")}
+    assert second == first
+    # Every entry was a hit: fetch() touches it, and nothing new was stored.
+    assert sorted(cache.glob("??/*")) == entries
+    assert all(path.stat().st_mtime_ns > 0 for path in entries)
+
+
+def test_make_files_async_clean_good(tmp_path: Path) -> None:
+    make_files_async_clean(tmp_path, files=3, limit=2, program=MARKOV_GEN)
+    assert len(list(tmp_path.glob("sample_*.csv"))) == 3
+
+
+def test_make_files_async_clean_fail(tmp_path: Path) -> None:
+    fail_second = [
+        sys.executable, "-c",
+        "import sys, pathlib; "
+        "pathlib.Path(sys.argv[-1]).write_text('# partial'); "
+        "sys.exit(13 if sys.argv[-1].endswith('_1.csv') else 0)",
+    ]
+    with pytest.raises(subprocess.CalledProcessError):
+        make_files_async_clean(tmp_path, files=3, limit=1, program=fail_second)
+    assert len(list(tmp_path.glob("sample_*.csv"))) == 0
+
+
+def test_make_files_async_clean_timeout(tmp_path: Path) -> None:
+    hang = [
+        sys.executable, "-c",
+        "import sys, pathlib, time; "
+        "pathlib.Path(sys.argv[-1]).write_text('# partial'); "
+        "time.sleep(30)",
+    ]
+    with pytest.raises(subprocess.TimeoutExpired):
+        make_files_async_clean(tmp_path, files=3, timeout=2, program=hang)
+    assert len(list(tmp_path.glob("sample_*.csv"))) == 0
+
+
 # End of Wrapping and combining CLI applications
 
 __test__ = {name: code for name, code in locals().items() if name.startswith("test_")}
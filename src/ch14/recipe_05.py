@@ -114,6 +114,28 @@ def summary_iter(options: argparse.Namespace) -> Iterator[dict[str, Any]]:
             yield parse_output(text)
 
 
+import asyncio
+from recipe_04 import run_commands
+
+
+def command_outputs(
+    commands: Iterable[list[str]],
+    limit: int | None = None,
+    timeout: float | None = None,
+) -> list[str]:
+    """Run the commands concurrently, capturing the output in memory."""
+    return asyncio.run(run_commands(list(commands), limit, timeout))
+
+
+def summary_iter_async(
+    options: argparse.Namespace,
+    limit: int | None = None,
+    timeout: float | None = None,
+) -> Iterator[dict[str, Any]]:
+    for text in command_outputs(command_iter(options), limit, timeout):
+        yield parse_output(text)
+
+
 def main(argv: list[str] = sys.argv[1:]) -> None:
     options = get_options(argv)
     parsed_results = list(summary_iter(options))
@@ -135,6 +157,21 @@ Built 10 files
 Total 10000 samples
 """
 
+test_command_outputs = """
+>>> commands = [
+...     [sys.executable, "src/ch14/markov_gen.py",
+...      "--samples", "100", "--output", f"data/ch14/sample_{n}.csv",
+...      "--randomize", str(n + 1)]
+...     for n in range(4)
+... ]
+>>> for text in command_outputs(commands, limit=2):
+...     print(parse_output(text))
+{'file': '"data/ch14/sample_0.csv"', 'samples': '100', 'randomize': '1'}
+{'file': '"data/ch14/sample_1.csv"', 'samples': '100', 'randomize': '2'}
+{'file': '"data/ch14/sample_2.csv"', 'samples': '100', 'randomize': '3'}
+{'file': '"data/ch14/sample_3.csv"', 'samples': '100', 'randomize': '4'}
+"""
+
 # Subsection: There's more...
 
 
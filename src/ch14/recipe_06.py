@@ -7,22 +7,97 @@
 # Subsection: How to do it...
 
 import argparse
+from concurrent import futures
+import contextlib
+import importlib
+import io
+import os
 import subprocess
 
 
-class Command:
-    def execute(self, options: argparse.Namespace) -> list[str]:
-        self.command = self.os_command(options)
+def call_main(module_name: str, argv: list[str], environ: dict[str, str]) -> str:
+    """Run ``module_name.main(argv)`` in this process, capturing stdout."""
+    os.environ.update(environ)
+    module = importlib.import_module(module_name)
+    with contextlib.redirect_stdout(io.StringIO()) as buffer:
+        try:
+            module.main(argv)
+        except SystemExit as ex:
+            if ex.code:
+                raise subprocess.CalledProcessError(
+                    ex.code if isinstance(ex.code, int) else 1,
+                    [module_name, *argv],
+                    buffer.getvalue(),
+                )
+    return buffer.getvalue()
+
+
+class Executor:
+    """Runs a command as a subprocess."""
+
+    def run(self, command: "Command", options: argparse.Namespace) -> str:
+        command.command = command.os_command(options)
         results = subprocess.run(
-            self.command,
+            command.command,
             check=True, stdout=subprocess.PIPE, text=True
         )
-        self.output = results.stdout
+        return results.stdout
+
+
+class InProcessExecutor(Executor):
+    """Runs a command's ``main(argv)`` in this process."""
+
+    def run(self, command: "Command", options: argparse.Namespace) -> str:
+        entry_point = command.entry_point(options)
+        if entry_point is None:
+            return super().run(command, options)
+        module_name, argv = entry_point
+        return call_main(module_name, argv, {})
+
+
+class PoolExecutor(Executor):
+    """
+    Runs a command's ``main(argv)`` in a warm worker from a persistent pool.
+    The environment is copied to the worker for each command.
+    """
+
+    def __init__(self, workers: int | None = None) -> None:
+        self.pool = futures.ProcessPoolExecutor(max_workers=workers)
+
+    def run(self, command: "Command", options: argparse.Namespace) -> str:
+        entry_point = command.entry_point(options)
+        if entry_point is None:
+            return super().run(command, options)
+        module_name, argv = entry_point
+        worker = self.pool.submit(call_main, module_name, argv, dict(os.environ))
+        return worker.result()
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+    def __enter__(self) -> "PoolExecutor":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class Command:
+    def __init__(self, executor: Executor | None = None) -> None:
+        self.executor = executor or Executor()
+        self.command: list[str] = []
+
+    def execute(self, options: argparse.Namespace) -> list[str]:
+        self.output = self.executor.run(self, options)
         return [self.output]
 
     def os_command(self, options: argparse.Namespace) -> list[str]:
         return ["echo", self.__class__.__name__, repr(options)]
 
+    def entry_point(self, options: argparse.Namespace) -> tuple[str, list[str]] | None:
+        """The module with a ``main(argv)`` function, and the ``argv``."""
+        return None
+
 
 import os
 
@@ -39,6 +114,9 @@ class Generate(Command):
             "--output", options.output_file,
         ]
 
+    def entry_point(self, options: argparse.Namespace) -> tuple[str, list[str]]:
+        return "markov_gen", [str(arg) for arg in self.os_command(options)[1:]]
+
 
 from typing import cast
 
@@ -55,6 +133,9 @@ class Summarize(Command):
         command += cast(list[str], options.output_files)
         return command
 
+    def entry_point(self, options: argparse.Namespace) -> tuple[str, list[str]]:
+        return "markov_summ_2", [str(arg) for arg in self.os_command(options)[2:]]
+
 
 def demo() -> None:
     options = argparse.Namespace(
@@ -124,7 +205,7 @@ from pathlib import Path
 class IterativeGenerator(Command):
 
     def execute(self, options: argparse.Namespace) -> list[str]:
-        gen_step = Generate()
+        gen_step = Generate(self.executor)
         output_files = []
         results: list[str] = []
         for i in range(options.iterations):
@@ -134,7 +215,7 @@ class IterativeGenerator(Command):
             # Future: parse step1_output and save the summary
             results.extend(step1_output)
             output_files.append(options.output_file)
-        summ_step = Summarize()
+        summ_step = Summarize(self.executor)
         options.output_files = output_files
         step2_output = summ_step.execute(options)
         results.extend(step2_output)
@@ -166,6 +247,98 @@ test_iteration = """
 ...
 """
 
+# Subsection: There's more...
+# Topic: Stopping when the estimate is precise enough
+
+from statistics import NormalDist
+import markov_summ_2
+
+
+def wilson_interval(successes: int, total: int, z: float) -> tuple[float, float]:
+    """
+    The Wilson score interval for a proportion: (center, half-width).
+
+    >>> center, half_width = wilson_interval(489, 1000, 1.96)
+    >>> round(center, 4), round(half_width, 4)
+    (0.489, 0.0309)
+    """
+    p = successes / total
+    denominator = 1 + z**2 / total
+    center = (p + z**2 / (2 * total)) / denominator
+    half_width = z * (p * (1 - p) / total + z**2 / (4 * total**2)) ** 0.5 / denominator
+    return center, half_width
+
+
+class SequentialGenerator(Command):
+    """
+    Generate batches of ``options.samples`` until the confidence interval
+    for P(Success) has a half-width of at most ``options.precision``,
+    or ``options.iterations`` batches have been generated.
+    There must be at least one batch, of at least one sample, to have an estimate.
+    """
+
+    def execute(self, options: argparse.Namespace) -> list[str]:
+        for name in "iterations", "samples":
+            if getattr(options, name) < 1:
+                raise ValueError(f"{name} must be at least 1, not {getattr(options, name)}")
+        z = NormalDist().inv_cdf((1 + options.confidence) / 2)
+        gen_step = Generate(self.executor)
+        output_files = []
+        results: list[str] = []
+        successes = total = 0
+        for i in range(options.iterations):
+            options.output_file = f"data/output_{i}.csv"
+            options.randomize = i + 1
+            results.extend(gen_step.execute(options))
+            output_files.append(options.output_file)
+            outcomes, _ = markov_summ_2.process_files([Path(options.output_file)])
+            successes += outcomes["Success"]
+            total += outcomes.total()
+            self.estimate, self.half_width = wilson_interval(successes, total, z)
+            if self.half_width <= options.precision:
+                break
+        self.samples_used = total
+        summ_step = Summarize(self.executor)
+        options.output_files = output_files
+        results.extend(summ_step.execute(options))
+        results.append(
+            f"Samples used: {self.samples_used}\n"
+            f"P(Success) = {self.estimate:.4f} ± {self.half_width:.4f} "
+            f"({options.confidence:.0%} confidence)\n"
+        )
+        return results
+
+
+test_sequential = """
+>>> options = argparse.Namespace(
+...     samples=1000,
+...     iterations=10,
+...     precision=0.02,
+...     confidence=0.95,
+...     summary_file=None,
+... )
+>>> sg = SequentialGenerator(InProcessExecutor())
+>>> results = sg.execute(options)
+>>> len(results)
+5
+>>> print(results[-1])
+Samples used: 3000
+P(Success) = 0.4920 ± 0.0179 (95% confidence)
+<BLANKLINE>
+
+>>> options.iterations = 0
+>>> sg.execute(options)
+Traceback (most recent call last):
+...
+ValueError: iterations must be at least 1, not 0
+>>> options.iterations, options.samples = 10, 0
+>>> sg.execute(options)
+Traceback (most recent call last):
+...
+ValueError: samples must be at least 1, not 0
+"""
+
+
 # Subsection: There's more...
 # Topic: Building conditional processing
 
@@ -174,10 +347,10 @@ class ConditionalGenSumm(Command):
     """Generator with conditional Summarization"""
 
     def execute(self, options: argparse.Namespace) -> list[str]:
-        step1 = Generate()
+        step1 = Generate(self.executor)
         output = step1.execute(options)
         if "summary_file" in options:
-            step2 = Summarize()
+            step2 = Summarize(self.executor)
             output.extend(step2.execute(options))
         return output
 
@@ -243,6 +416,55 @@ test_conditional = """
 <BLANKLINE>
 """
 
+# Subsection: There's more...
+# Topic: Running commands without a new interpreter
+
+# The in-process and pool executors run markov_gen.py, not the compiled
+# markov_gen application, so a seed gives the Python implementation's results.
+
+test_executors = """
+>>> options = argparse.Namespace(
+...     output_file=Path("data/x12.csv"),
+...     output_files=[Path("data/x12.csv")],
+...     samples=1000,
+...     randomize=42,
+...     summary_file=None,
+... )
+>>> with PoolExecutor(workers=1) as pool:
+...     for executor in InProcessExecutor(), pool:
+...         results = ConditionalGenSumm(executor).execute(options)
+...         print(results[0])
+...         print(results[1].partition("## Fail")[0])
+# file = "data/x12.csv"
+# samples = 1000
+# randomize = 42
+<BLANKLINE>
+## Overview
++==========+==========+
+| Outcome  |  Count   |
++----------+----------+
+| Fail     |      518 |
++----------+----------+
+| Success  |      482 |
++==========+==========+
+<BLANKLINE>
+<BLANKLINE>
+# file = "data/x12.csv"
+# samples = 1000
+# randomize = 42
+<BLANKLINE>
+## Overview
++==========+==========+
+| Outcome  |  Count   |
++----------+----------+
+| Fail     |      518 |
++----------+----------+
+| Success  |      482 |
++==========+==========+
+<BLANKLINE>
+<BLANKLINE>
+"""
+
 
 # End of Controlling complex sequences of steps
 